@@ -0,0 +1,46 @@
+import hashlib
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def get_version(namespace):
+    """Версия и время последнего изменения данных пространства имён."""
+    key = f'response_cache:{namespace}:version'
+    version = cache.get(key)
+    if version is None:
+        version = (uuid.uuid4().hex, int(time.time()))
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(namespace):
+    """Сбрасывает все закэшированные ответы пространства имён."""
+    cache.set(
+        f'response_cache:{namespace}:version',
+        (uuid.uuid4().hex, int(time.time())), None)
+
+
+def get_cached(namespace, path, build):
+    """Возвращает (data, etag, last_modified) для пути из кэша.
+
+    build вызывается при промахе и должен вернуть Response; ответы
+    с кодом, отличным от 200, не кэшируются и возвращаются как есть.
+    """
+    version, last_modified = get_version(namespace)
+    key = f'response_cache:{namespace}:{version}:{path}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    response = build()
+    if response.status_code != 200:
+        return response
+    etag = '"{}"'.format(hashlib.md5(json.dumps(
+        response.data, sort_keys=True, default=str).encode()).hexdigest())
+    cached = (response.data, etag, last_modified)
+    cache.set(key, cached, settings.RESPONSE_CACHE_TIMEOUT)
+    return cached
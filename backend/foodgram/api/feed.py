@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from posts.models import Followers, Recipe
+
+
+def get_timeline_key(user_id):
+    return f'feed:{user_id}'
+
+
+def get_timeline(user_id):
+    """Id рецептов ленты пользователя, от новых к старым.
+
+    Лента строится одним запросом при промахе и хранится в кэше не
+    дольше FEED_TIMEOUT секунд и не длиннее FEED_SIZE рецептов.
+    """
+    key = get_timeline_key(user_id)
+    timeline = cache.get(key)
+    if timeline is None:
+        timeline = list(Recipe.objects.filter(
+            author__following__user_id=user_id
+        ).order_by('-pub_date', '-id').values_list(
+            'id', flat=True)[:settings.FEED_SIZE])
+        cache.set(key, timeline, settings.FEED_TIMEOUT)
+    return timeline
+
+
+def push_recipe(recipe):
+    """Добавляет новый рецепт в начало уже закэшированных лент."""
+    keys = [
+        get_timeline_key(user_id)
+        for user_id in Followers.objects.filter(
+            author_id=recipe.author_id).values_list('user_id', flat=True)]
+    timelines = cache.get_many(keys)
+    if timelines:
+        cache.set_many({
+            key: [recipe.pk, *timeline][:settings.FEED_SIZE]
+            for key, timeline in timelines.items()},
+            settings.FEED_TIMEOUT)
+
+
+def reset_timeline(user_id):
+    cache.delete(get_timeline_key(user_id))
@@ -0,0 +1,73 @@
+import binascii
+import uuid
+from base64 import b64decode
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'GIF87a', 'gif', 'image/gif'),
+    (b'GIF89a', 'gif', 'image/gif'),
+)
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+def sniff_image(header):
+    """Расширение и MIME-тип картинки по первым байтам или None."""
+    for signature, extension, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension, content_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    return None
+
+
+class Base64ImageField(serializers.FileField):
+    """Картинка в виде data URI, декодируемая по частям во временный файл.
+
+    Размер ограничен RECIPE_IMAGE_MAX_SIZE и проверяется до декодирования,
+    формат определяется по сигнатуре первых байт без разбора картинки.
+    Ссылки http(s) на уже загруженную картинку пропускаются.
+    """
+
+    default_error_messages = {
+        'invalid_image': 'Загрузите картинку в формате PNG, JPEG, GIF или '
+                         'WebP в виде data URI.',
+        'too_large': 'Картинка больше {max_size} байт.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('http'):
+            raise SkipField()
+        if not isinstance(data, str) or not data.startswith('data:'):
+            self.fail('invalid_image')
+        _, _, encoded = data.partition(';base64,')
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(encoded) // 4 * 3 > max_size + 2:
+            self.fail('too_large', max_size=max_size)
+        upload = TemporaryUploadedFile(
+            'image', 'application/octet-stream', 0, None)
+        try:
+            chunk_size = DECODE_CHUNK_SIZE // 4 * 4
+            for start in range(0, len(encoded), chunk_size):
+                upload.write(b64decode(
+                    encoded[start:start + chunk_size], validate=True))
+        except (binascii.Error, ValueError):
+            upload.close()
+            self.fail('invalid_image')
+        upload.size = upload.tell()
+        upload.seek(0)
+        sniffed = sniff_image(upload.read(12))
+        if sniffed is None or upload.size > max_size:
+            upload.close()
+            if sniffed is None:
+                self.fail('invalid_image')
+            self.fail('too_large', max_size=max_size)
+        upload.seek(0)
+        extension, upload.content_type = sniffed
+        upload.name = f'{uuid.uuid4()}.{extension}'
+        return upload
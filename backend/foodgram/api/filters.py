@@ -1,8 +1,15 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Case, F, FloatField, Value, When
 import django_filters as filters
+from rest_framework.filters import BaseFilterBackend
 
 from users.models import User
 from posts.models import Ingredient, Recipe
+from posts.search import recipe_index
+from posts.tags import tag_ids
 
 
 class TagsMultipleChoiceField(
@@ -25,12 +32,15 @@ class TagsFilter(filters.AllValuesMultipleFilter):
 
 
 class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    def filter_name(self, queryset, name, value):
+        return queryset.search(value)
+
 
 class RecipeFilter(filters.FilterSet):
     author = filters.ModelChoiceFilter(
@@ -48,3 +58,75 @@ class RecipeFilter(filters.FilterSet):
     class Meta:
         model = Recipe
         fields = ['is_favorited', 'is_in_shopping_cart', 'author', 'tags']
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск по названию, описанию и ингредиентам."""
+
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        if connection.vendor == 'postgresql':
+            search_query = SearchQuery(query, config=settings.SEARCH_CONFIG)
+            return queryset.filter(search_vector=search_query).annotate(
+                search_rank=SearchRank(F('search_vector'), search_query)
+            ).order_by('-search_rank', '-pub_date')
+        ranked = recipe_index.search(query, settings.RECIPE_SEARCH_MAX_RESULTS)
+        if not ranked:
+            return queryset.none()
+        return queryset.filter(pk__in=[pk for pk, _ in ranked]).annotate(
+            search_rank=Case(
+                *(When(pk=pk, then=Value(score)) for pk, score in ranked),
+                output_field=FloatField())
+        ).order_by('-search_rank', '-pub_date')
+
+
+class RecipeOrderingFilter(BaseFilterBackend):
+    """Сортировка рецептов: новые, популярные или быстрые."""
+
+    ordering_param = 'ordering'
+    orderings = {
+        'newest': ('-pub_date', '-id'),
+        'popular': ('-popularity', '-pub_date', '-id'),
+        'quickest': ('cooking_time', '-pub_date', '-id'),
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.orderings.get(
+            request.query_params.get(self.ordering_param))
+        if ordering is None:
+            return queryset
+        return queryset.order_by(*ordering)
+
+
+class RecipeTagsFilter(BaseFilterBackend):
+    """Фильтр по slug тэгов: любой из них (any) или все сразу (all).
+
+    Вместо JOIN с тэгами и DISTINCT — полусоединение с таблицей связи
+    по id тэгов, которые берутся из кэша процесса.
+    """
+
+    tags_param = 'tags'
+    mode_param = 'tags_mode'
+
+    def filter_queryset(self, request, queryset, view):
+        slugs = set(request.query_params.getlist(self.tags_param))
+        if not slugs:
+            return queryset
+        ids = tag_ids.get(slugs)
+        if request.query_params.get(self.mode_param) == 'all':
+            if len(ids) < len(slugs):
+                return queryset.none()
+            for tag_id in ids.values():
+                queryset = queryset.filter(pk__in=self.tagged([tag_id]))
+            return queryset
+        if not ids:
+            return queryset.none()
+        return queryset.filter(pk__in=self.tagged(ids.values()))
+
+    def tagged(self, ids):
+        return Recipe.tags.through.objects.filter(
+            tag_id__in=ids).values('recipe_id')
@@ -0,0 +1,370 @@
+import csv
+import io
+import json
+import math
+import random
+import tempfile
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.utils import CursorDebugWrapper
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from posts.models import (Favorite, Followers, Ingredient, Recipe,
+                          RecipiesIngredients, ShoppingCart,
+                          ShoppingListIngredient, Tag)
+from users.models import User
+
+PASSWORD = 'Benchmark-pass-1'
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAA'
+    'DElEQVR4nGP4//8/AAX+Av4N70a4AAAAAElFTkSuQmCC')
+TAGS = (
+    {'name': 'Завтрак', 'color': '#E26C2D', 'slug': 'breakfast'},
+    {'name': 'Обед', 'color': '#49B64E', 'slug': 'dinner'},
+    {'name': 'Ужин', 'color': '#8775D2', 'slug': 'supper'},)
+
+
+class RowCountingCursor(CursorDebugWrapper):
+    """Курсор, считающий строки, полученные из базы."""
+
+    def __init__(self, cursor, db, counter):
+        super().__init__(cursor, db)
+        self.counter = counter
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.counter['rows'] += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        self.counter['rows'] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.counter['rows'] += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.counter['rows'] += 1
+            yield row
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер времени ответа, числа SQL-запросов и строк '
+        'для всех эндпоинтов API на синтетических данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--recipe-ingredients', type=int, default=8)
+        parser.add_argument('--follows', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--carts', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.verbosity = options['verbosity']
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(
+                        MEDIA_ROOT=media_root, JOBS_EAGER=True):
+                dataset = self.seed(options)
+                report = {
+                    'database': connection.vendor,
+                    'dataset': dataset,
+                    'repeat': options['repeat'],
+                    'endpoints': self.run(options['repeat']),
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        output = json.dumps(
+            report, ensure_ascii=False, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='UTF-8') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def seed(self, options):
+        """Наполняет тестовую базу синтетическими данными."""
+        rnd = self.random
+        Tag.objects.bulk_create(Tag(**tag) for tag in TAGS)
+        with open(
+            f'{settings.BASE_DIR}/static/data/ingredients.csv',
+            'r', encoding='UTF-8'
+        ) as csv_file:
+            Ingredient.objects.bulk_create(
+                Ingredient(**data) for data in islice(
+                    csv.DictReader(csv_file), options['ingredients']))
+
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            User(
+                email=f'user{number}@example.com',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password)
+            for number in range(options['users']))
+        user_ids = list(User.objects.values_list('id', flat=True))
+
+        Recipe.objects.bulk_create(
+            Recipe(
+                author_id=rnd.choice(user_ids),
+                name=f'Рецепт {number}',
+                text='Описание рецепта. ' * rnd.randint(1, 20),
+                cooking_time=rnd.randint(1, 180))
+            for number in range(options['recipes']))
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        per_recipe = min(options['recipe_ingredients'], len(ingredient_ids))
+        RecipiesIngredients.objects.bulk_create(
+            RecipiesIngredients(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=rnd.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in rnd.sample(ingredient_ids, per_recipe))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rnd.sample(tag_ids, rnd.randint(1, len(tag_ids))))
+        Recipe.objects.update_search_documents()
+
+        follows = []
+        for user_id in user_ids:
+            authors = [
+                author_id for author_id in rnd.sample(
+                    user_ids, min(options['follows'] + 1, len(user_ids)))
+                if author_id != user_id]
+            follows.extend(
+                Followers(user_id=user_id, author_id=author_id)
+                for author_id in authors[:options['follows']])
+        Followers.objects.bulk_create(follows)
+        for model, count in (
+                (Favorite, options['favorites']),
+                (ShoppingCart, options['carts'])):
+            model.objects.bulk_create(
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in rnd.sample(
+                    recipe_ids, min(count, len(recipe_ids))))
+        ShoppingListIngredient.objects.rebuild(user_ids)
+        call_command('recount', stdout=io.StringIO())
+        Recipe.objects.update_popularity()
+        return {
+            'users': len(user_ids),
+            'recipes': len(recipe_ids),
+            'ingredients': len(ingredient_ids),
+            'recipe_ingredients': RecipiesIngredients.objects.count(),
+            'follows': Followers.objects.count(),
+            'favorites': Favorite.objects.count(),
+            'carts': ShoppingCart.objects.count(),
+        }
+
+    def get_endpoints(self, state):
+        """Маршруты api/urls.py в порядке, сохраняющем данные неизменными.
+
+        Каждый элемент: (имя, метод, путь, тело, авторизован ли клиент).
+        Путь и тело могут зависеть от ответов предыдущих запросов.
+        """
+        author, recipe = state['author'], state['recipe']
+        new_recipe = {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+            'image': IMAGE,
+            'tags': [state['tag'].id],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in state['ingredients']],
+        }
+        return (
+            ('tags-list', 'get', '/api/tags/', None, False),
+            ('tags-detail', 'get', f'/api/tags/{state["tag"].id}/',
+             None, False),
+            ('ingredients-list', 'get', '/api/ingredients/', None, False),
+            ('ingredients-search', 'get',
+             f'/api/ingredients/?name={state["prefix"]}', None, False),
+            ('ingredients-detail', 'get',
+             f'/api/ingredients/{state["ingredients"][0]}/', None, False),
+            ('recipes-list-anonymous', 'get', '/api/recipes/', None, False),
+            ('recipes-list', 'get', '/api/recipes/', None, True),
+            ('recipes-list-deep-page', 'get',
+             f'/api/recipes/?page={state["last_page"]}', None, True),
+            ('recipes-list-cursor', 'get', '/api/recipes/?cursor=',
+             None, True),
+            ('recipes-list-popular', 'get', '/api/recipes/?ordering=popular',
+             None, True),
+            ('recipes-list-popular-cursor', 'get',
+             '/api/recipes/?ordering=popular&cursor=', None, True),
+            ('recipes-list-tags', 'get',
+             '/api/recipes/?tags=breakfast&tags=dinner', None, True),
+            ('recipes-list-tags-all', 'get',
+             '/api/recipes/?tags=breakfast&tags=dinner&tags_mode=all',
+             None, True),
+            ('recipes-list-author', 'get',
+             f'/api/recipes/?author={author.id}', None, True),
+            ('recipes-list-favorited', 'get',
+             '/api/recipes/?is_favorited=1', None, True),
+            ('recipes-list-in-cart', 'get',
+             '/api/recipes/?is_in_shopping_cart=1', None, True),
+            ('recipes-search', 'get', '/api/recipes/?search=рецепт',
+             None, True),
+            ('recipes-feed', 'get', '/api/recipes/feed/', None, True),
+            ('recipes-detail', 'get', f'/api/recipes/{recipe.id}/',
+             None, True),
+            ('recipes-create', 'post', '/api/recipes/', new_recipe, True),
+            ('recipes-update', 'patch',
+             lambda: f'/api/recipes/{state["created"]}/', new_recipe, True),
+            ('recipes-delete', 'delete',
+             lambda: f'/api/recipes/{state["created"]}/', None, True),
+            ('favorite-add', 'post',
+             f'/api/recipes/{recipe.id}/favorite/', None, True),
+            ('favorite-delete', 'delete',
+             f'/api/recipes/{recipe.id}/favorite/', None, True),
+            ('shopping-cart-add', 'post',
+             f'/api/recipes/{recipe.id}/shopping_cart/', None, True),
+            ('shopping-cart-delete', 'delete',
+             f'/api/recipes/{recipe.id}/shopping_cart/', None, True),
+            ('shopping-cart-download', 'get',
+             '/api/recipes/download_shopping_cart/', None, True),
+            ('shopping-cart-download-csv', 'get',
+             '/api/recipes/download_shopping_cart/?format=csv', None, True),
+            ('shopping-cart-download-pdf', 'get',
+             '/api/recipes/download_shopping_cart/?format=pdf', None, True),
+            ('shopping-cart-export', 'post',
+             '/api/recipes/download_shopping_cart/exports/',
+             {'format': 'pdf'}, True),
+            ('users-list', 'get', '/api/users/', None, True),
+            ('users-detail', 'get', f'/api/users/{author.id}/', None, True),
+            ('users-me', 'get', '/api/users/me/', None, True),
+            ('users-subscriptions', 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None, True),
+            ('subscribe-add', 'post',
+             f'/api/users/{state["stranger"].id}/subscribe/', None, True),
+            ('subscribe-delete', 'delete',
+             f'/api/users/{state["stranger"].id}/subscribe/', None, True),
+            ('users-create', 'post', '/api/users/',
+             lambda: {
+                 'email': f'new{state["iteration"]}@example.com',
+                 'username': f'new{state["iteration"]}',
+                 'first_name': 'Имя',
+                 'last_name': 'Фамилия',
+                 'password': PASSWORD}, False),
+            ('users-set-password', 'post', '/api/users/set_password/',
+             {'current_password': PASSWORD, 'new_password': PASSWORD}, True),
+            ('token-login', 'post', '/api/auth/token/login/',
+             {'email': state['login_user'].email, 'password': PASSWORD},
+             False),
+            ('token-logout', 'post', '/api/auth/token/logout/', None,
+             lambda: state['login_token']),
+        )
+
+    def get_state(self):
+        user = User.objects.order_by('id').first()
+        stranger = User.objects.exclude(
+            id__in=user.follower.values('author')).exclude(id=user.id).first()
+        if stranger is None:
+            subscription = user.follower.first()
+            stranger = subscription.author
+            subscription.delete()
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        ingredients = list(
+            Ingredient.objects.values_list('id', flat=True)[:10])
+        return {
+            'user': user,
+            'author': recipe.author,
+            'recipe': recipe,
+            'stranger': stranger,
+            'login_user': User.objects.order_by('-id').first(),
+            'tag': Tag.objects.first(),
+            'ingredients': ingredients,
+            'prefix': Ingredient.objects.first().name[:2],
+            'last_page': max(
+                math.ceil(Recipe.objects.count() / page_size), 1),
+            'token': Token.objects.create(user=user).key,
+            'login_token': None,
+            'created': None,
+            'iteration': 0,
+        }
+
+    def request(self, state, method, path, data, auth):
+        client = APIClient()
+        if callable(auth):
+            auth = auth()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {auth}')
+        elif auth:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {state["token"]}')
+        path = path() if callable(path) else path
+        data = data() if callable(data) else data
+        counter = {'rows': 0}
+        connection.make_debug_cursor = (
+            lambda cursor: RowCountingCursor(cursor, connection, counter))
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, data, format='json')
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+        finally:
+            del connection.make_debug_cursor
+        return path, response, elapsed, len(queries), counter['rows']
+
+    def run(self, repeat):
+        """Прогоняет все эндпоинты и собирает статистику."""
+        state = self.get_state()
+        endpoints = self.get_endpoints(state)
+        timings = {name: [] for name, *_ in endpoints}
+        report = {}
+        for iteration in range(repeat):
+            state['iteration'] = iteration
+            for name, method, path, data, auth in endpoints:
+                path, response, elapsed, queries, rows = self.request(
+                    state, method, path, data, auth)
+                if name == 'recipes-create':
+                    state['created'] = response.data.get('id')
+                if name == 'token-login':
+                    state['login_token'] = response.data.get('auth_token')
+                timings[name].append(elapsed * 1000)
+                report[name] = {
+                    'method': method.upper(),
+                    'path': path,
+                    'status': response.status_code,
+                    'queries': max(
+                        queries, report.get(name, {}).get('queries', 0)),
+                    'rows': max(rows, report.get(name, {}).get('rows', 0)),
+                }
+            if self.verbosity > 1:
+                self.stderr.write(f'Итерация {iteration + 1}/{repeat}')
+        for name, values in timings.items():
+            report[name]['p50_ms'] = round(percentile(values, 0.5), 2)
+            report[name]['p95_ms'] = round(percentile(values, 0.95), 2)
+        return report
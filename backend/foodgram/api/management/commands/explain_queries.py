@@ -0,0 +1,140 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from jobs.models import Job
+from jobs.queue import get_claimable
+from posts.models import Ingredient, Recipe, Tag
+from users.models import User
+
+# Полный проход по таблице: «Seq Scan on t» в PostgreSQL и «SCAN t» /
+# «SCAN TABLE t» без «USING ... INDEX» в SQLite.
+SEQ_SCAN = re.compile(
+    r'Seq Scan on (?P<pg>\S+)'
+    r'|^\W*SCAN (?:TABLE )?(?P<sqlite>\w+)(?!.*\bUSING\b)')
+SQL_PREVIEW = 300
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN для запросов основных GET-эндпоинтов API и очереди '
+        'задач; отмечает полные проходы по таблицам. Планировщик выбирает '
+        'Seq Scan на маленьких таблицах, поэтому запускать стоит на базе '
+        'с реальным объёмом данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Email пользователя для запросов с авторизацией.')
+        parser.add_argument(
+            '--ignore', nargs='*', default=['posts_tag'],
+            help='Таблицы, проход по которым не считается проблемой.')
+        parser.add_argument(
+            '--fail', action='store_true',
+            help='Завершиться с ошибкой, если найдены полные проходы.')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(
+                    f'Пользователь {options["user"]} не найден.')
+        else:
+            user = User.objects.order_by('id').first()
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        if user is None or recipe is None:
+            raise CommandError('Нужны хотя бы один пользователь и рецепт.')
+        tables = set(connection.introspection.table_names())
+        tables.difference_update(options['ignore'])
+        flagged = 0
+        seen = set()
+        for name, queries in self.collect(user, recipe):
+            for sql in queries:
+                if sql in seen:
+                    continue
+                seen.add(sql)
+                scans = [
+                    line for line in self.explain(sql)
+                    if self.scanned_table(line) in tables]
+                if not scans:
+                    continue
+                flagged += 1
+                if options['verbosity'] < 2 and len(sql) > SQL_PREVIEW:
+                    sql = f'{sql[:SQL_PREVIEW]}...'
+                self.stdout.write(self.style.WARNING(f'{name}: {sql}'))
+                for line in scans:
+                    self.stdout.write(f'    {line}')
+        summary = f'Запросов: {len(seen)}, с полным проходом: {flagged}.'
+        if flagged and options['fail']:
+            raise CommandError(summary)
+        self.stdout.write(
+            self.style.WARNING(summary) if flagged
+            else self.style.SUCCESS(summary))
+
+    def get_paths(self, recipe):
+        tags = '&'.join(
+            f'tags={slug}'
+            for slug in Tag.objects.values_list('slug', flat=True)[:2])
+        ingredient = Ingredient.objects.order_by('id').first()
+        prefix = ingredient.name[:2] if ingredient else 'a'
+        return (
+            ('tags-list', '/api/tags/'),
+            ('ingredients-search', f'/api/ingredients/?name={prefix}'),
+            ('recipes-list', '/api/recipes/'),
+            ('recipes-list-cursor', '/api/recipes/?cursor='),
+            ('recipes-list-popular', '/api/recipes/?ordering=popular'),
+            ('recipes-list-quickest', '/api/recipes/?ordering=quickest'),
+            ('recipes-list-tags', f'/api/recipes/?{tags}'),
+            ('recipes-list-tags-all', f'/api/recipes/?{tags}&tags_mode=all'),
+            ('recipes-list-author',
+             f'/api/recipes/?author={recipe.author_id}'),
+            ('recipes-list-favorited', '/api/recipes/?is_favorited=1'),
+            ('recipes-list-in-cart', '/api/recipes/?is_in_shopping_cart=1'),
+            ('recipes-search', f'/api/recipes/?search={recipe.name[:20]}'),
+            ('recipes-feed', '/api/recipes/feed/'),
+            ('recipes-detail', f'/api/recipes/{recipe.pk}/'),
+            ('shopping-cart-download',
+             '/api/recipes/download_shopping_cart/'),
+            ('users-list', '/api/users/'),
+            ('users-detail', f'/api/users/{recipe.author_id}/'),
+            ('users-subscriptions',
+             '/api/users/subscriptions/?recipes_limit=3'),
+        )
+
+    def collect(self, user, recipe):
+        """Пары (эндпоинт, [SELECT ...]) без изменений в базе."""
+        client = APIClient()
+        client.force_authenticate(user)
+        with transaction.atomic():
+            for name, path in self.get_paths(recipe):
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(path)
+                    if getattr(response, 'streaming', False):
+                        b''.join(response.streaming_content)
+                yield name, self.selects(context)
+            with CaptureQueriesContext(connection) as context:
+                list(Job.objects.filter(
+                    get_claimable(timezone.now())
+                ).order_by('available_at', 'id').values_list('pk')[:10])
+            yield 'jobs-claim', self.selects(context)
+            transaction.set_rollback(True)
+
+    def selects(self, context):
+        return [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith('SELECT')]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix()} {sql}')
+            return [str(row[-1]) for row in cursor.fetchall()]
+
+    def scanned_table(self, line):
+        match = SEQ_SCAN.search(line)
+        if match is None:
+            return None
+        return (match.group('pg') or match.group('sqlite')).strip('"')
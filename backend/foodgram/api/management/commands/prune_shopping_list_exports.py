@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.shopping_list import EXPORT_DIR
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет выгрузки списков покупок, которые не менялись дольше '
+        'заданного срока. Новая выгрузка и так заменяет прежнюю, команда '
+        'убирает файлы брошенных корзин и старой раскладки без каталогов '
+        'пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        if not default_storage.exists(EXPORT_DIR):
+            return
+        border = timezone.now() - timedelta(days=options['days'])
+        directories, files = default_storage.listdir(EXPORT_DIR)
+        names = [f'{EXPORT_DIR}/{file}' for file in files]
+        for directory in directories:
+            names.extend(
+                f'{EXPORT_DIR}/{directory}/{file}'
+                for file in default_storage.listdir(
+                    f'{EXPORT_DIR}/{directory}')[1])
+        deleted = 0
+        for name in names:
+            if default_storage.get_modified_time(name) < border:
+                default_storage.delete(name)
+                deleted += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено выгрузок: {deleted}'))
@@ -1,3 +1,8 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .cache import get_cached
 from .permisions import IsAdminOrReadOnly
 
 
@@ -6,3 +11,36 @@ class PermissionAndPaginationMixin:
 
     permission_classes = (IsAdminOrReadOnly,)
     pagination_class = None
+
+
+class CachedResponseMixin:
+    """Миксина кэша ответов list/retrieve с ETag и Last-Modified.
+
+    Кэш версионируется по cache_namespace, версию сбрасывают сигналы
+    записи соответствующей модели.
+    """
+
+    cache_namespace = None
+
+    def cached_response(self, request, build):
+        cached = get_cached(
+            self.cache_namespace, request.get_full_path(), build)
+        if isinstance(cached, Response):
+            return cached
+        data, etag, last_modified = cached
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+            response=response)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(CachedResponseMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(CachedResponseMixin, self).retrieve(
+                request, *args, **kwargs))
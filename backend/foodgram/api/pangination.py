@@ -1,6 +1,192 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по полям сортировки queryset'а и id.
+
+    Курсор хранит значения полей сортировки крайней записи страницы,
+    поэтому следующая страница выбирается по индексу, без OFFSET и COUNT.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        ordering = list(
+            queryset.query.order_by or queryset.model._meta.ordering)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            reverse, values = json.loads(urlsafe_b64decode(encoded.encode()))
+            values = [
+                self.to_python(field, value)
+                for field, value in zip(self.ordering, values)]
+        except (BinasciiError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(reverse)
+
+    def encode_cursor(self, instance, reverse):
+        values = [
+            getattr(instance, field.lstrip('-')) for field in self.ordering]
+        encoded = urlsafe_b64encode(json.dumps(
+            [int(reverse), values], default=str).encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded)
+
+    def to_python(self, field, value):
+        name = field.lstrip('-')
+        try:
+            model_field = self.model._meta.get_field(
+                'id' if name == 'pk' else name)
+        except FieldDoesNotExist:
+            return value
+        return model_field.to_python(value)
+
+    def get_filter(self, position, reverse):
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            step = Q(**{f'{field.lstrip("-")}__{lookup}': position[index]})
+            for previous, value in zip(self.ordering[:index], position):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.cursor_query_param)
+        self.model = queryset.model
+        self.ordering = self.get_ordering(queryset)
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering]
+        if position is not None:
+            queryset = queryset.filter(self.get_filter(position, reverse))
+        page = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = page
+        return page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class TimelinePagination(BasePagination):
+    """Курсорная пагинация по готовому списку id.
+
+    Курсор — id последнего показанного рецепта, следующая страница
+    начинается сразу за ним.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    invalid_cursor_message = 'Неверный курсор.'
+
+    get_page_size = KeysetPagination.get_page_size
+
+    def paginate_queryset(self, ids, request, view=None):
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.cursor_query_param)
+        start = 0
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                start = ids.index(int(cursor)) + 1
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        page_size = self.get_page_size(request)
+        self.page = ids[start:start + page_size]
+        self.has_next = start + page_size < len(ids)
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
 
 
 class LimitPage(PageNumberPagination):
+    """Постраничная пагинация; с параметром cursor — курсорная."""
+
     page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            self.keyset.page_size = self.page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,12 +1,17 @@
 import django.contrib.auth.password_validation as validators
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.hashers import make_password
-from drf_base64.fields import Base64ImageField
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
-from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import NotFound
 
-from posts.models import (Favorite_Recipe, Followers, Ingredient, Recipe,
-                          RecipiesIngredients, Shopping, Tag)
+from posts.models import (Favorite, Followers, Ingredient, Recipe,
+                          RecipiesIngredients, ShoppingCart,
+                          ShoppingListIngredient, Tag)
+from posts.thumbnails import get_thumbnail_urls, schedule_thumbnails
+
+from .fields import Base64ImageField
 
 User = get_user_model()
 
@@ -39,11 +44,28 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class SubscribeRecipeSerializer(serializers.ModelSerializer):
+class ThumbnailsMixin(serializers.Serializer):
+    thumbnails = serializers.SerializerMethodField()
+
+    def get_thumbnails(self, obj):
+        urls = get_thumbnail_urls(obj)
+        request = self.context.get('request')
+        if urls is None or request is None:
+            return urls
+        return {
+            size: {
+                image_format: request.build_absolute_uri(url)
+                for image_format, url in formats.items()}
+            for size, formats in urls.items()}
+
+
+class SubscribeRecipeSerializer(
+        ThumbnailsMixin,
+        serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
 
 
 class IngredientsEditSerializer(serializers.ModelSerializer):
@@ -79,6 +101,11 @@ class FollowersSerializer(serializers.ModelSerializer):
             'is_subscribed', 'recipes', 'recipes_count',)
 
     def get_recipes(self, obj):
+        previews = self.context.get('recipes_previews')
+        if previews is not None:
+            return SubscribeRecipeSerializer(
+                previews.get(obj.author_id, ()),
+                many=True).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         recipes = (
@@ -127,38 +154,38 @@ class TokenSerializer(serializers.Serializer):
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(
-        max_length=None,
-        use_url=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all())
+    image = Base64ImageField()
+    tags = serializers.ListField(
+        child=serializers.IntegerField())
     ingredients = IngredientsEditSerializer(
         many=True)
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = ('search_document', 'search_vector')
         read_only_fields = ('author',)
 
     def validate(self, data):
-        ingredients = data['ingredients']
-        ingredient_list = []
-        for items in ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=items['id'])
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    'Ингредиент должен быть уникальным!')
-            ingredient_list.append(ingredient)
+        ingredient_ids = [item['id'] for item in data.get('ingredients', ())]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Ингредиент должен быть уникальным!')
+        found = set(Ingredient.objects.filter(
+            id__in=ingredient_ids).values_list('id', flat=True))
+        if len(found) != len(ingredient_ids):
+            raise NotFound(
+                f'Ингредиентов {set(ingredient_ids) - found} не существует!')
+        if 'tags' not in data:
+            return data
         tags = data['tags']
         if not tags:
             raise serializers.ValidationError(
                 'Нужен хотя бы один тэг для рецепта!')
-        for tag_name in tags:
-            if not Tag.objects.filter(name=tag_name).exists():
-                raise serializers.ValidationError(
-                    f'Тэга {tag_name} не существует!')
+        missing = set(tags) - set(Tag.objects.filter(
+            id__in=tags).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Тэгов {missing} не существует!')
         return data
 
     def validate_cooking_time(self, cooking_time):  #
@@ -178,33 +205,84 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return ingredients
 
     def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            RecipiesIngredients.objects.create(
+        RecipiesIngredients.objects.bulk_create(
+            RecipiesIngredients(
                 recipe=recipe,
                 ingredient_id=ingredient.get('id'),
                 amount=ingredient.get('amount'), )
-
+            for ingredient in ingredients)
+
+    def update_ingredients(self, ingredients, recipe):
+        """Меняет только добавленные, изменённые и удалённые строки.
+
+        Возвращает прежний состав рецепта {ingredient_id: amount}.
+        """
+        existing = {item.ingredient_id: item for item in recipe.recipe.all()}
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in existing.items()}
+        to_create, to_update = [], []
+        for ingredient in ingredients:
+            item = existing.pop(ingredient['id'], None)
+            if item is None:
+                to_create.append(ingredient)
+            elif item.amount != ingredient['amount']:
+                item.amount = ingredient['amount']
+                to_update.append(item)
+        recipe.recipe.filter(
+            pk__in=[item.pk for item in existing.values()]).delete()
+        RecipiesIngredients.objects.bulk_update(to_update, ('amount',))
+        self.create_ingredients(to_create, recipe)
+        return old_amounts
+
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        Recipe.objects.filter(pk=recipe.pk).update_search_documents()
+        schedule_thumbnails(recipe)
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if 'ingredients' in validated_data:
             ingredients = validated_data.pop('ingredients')
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
+            old_amounts = self.update_ingredients(ingredients, instance)
+            ShoppingListIngredient.objects.change_recipe(
+                instance, old_amounts,
+                {item['id']: item['amount'] for item in ingredients})
         if 'tags' in validated_data:
             instance.tags.set(
                 validated_data.pop('tags'))
-        return super().update(
+        if 'image' in validated_data:
+            validated_data['thumbnails_ready'] = False
+        instance = super().update(
             instance, validated_data)
+        Recipe.objects.filter(pk=instance.pk).update_search_documents()
+        if 'image' in validated_data:
+            schedule_thumbnails(instance)
+        return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=RecipiesIngredients.objects.select_related(
+                    'ingredient')))
         return RecipeReadSerializer(
             instance,
             context={
@@ -215,6 +293,9 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 class GetIsSubscribedMixin:
 
     def get_is_subscribed(self, obj):
+        annotated = getattr(obj, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
@@ -235,8 +316,40 @@ class RecipeUserSerializer(
             'first_name', 'last_name', 'is_subscribed')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+def set_user_flags(recipes, request):
+    """Проставляет рецептам is_favorited, is_in_shopping_cart и
+    author_is_subscribed тремя запросами на всю пачку.
+    """
+    user = getattr(request, 'user', None)
+    favorited = in_cart = followed = set()
+    if recipes and user is not None and user.is_authenticated:
+        ids = [recipe.pk for recipe in recipes]
+        favorited = set(Favorite.objects.filter(
+            user=user, recipe_id__in=ids).values_list('recipe_id', flat=True))
+        in_cart = set(ShoppingCart.objects.filter(
+            user=user, recipe_id__in=ids).values_list('recipe_id', flat=True))
+        followed = set(user.follower.filter(
+            author_id__in={recipe.author_id for recipe in recipes}
+        ).values_list('author_id', flat=True))
+    for recipe in recipes:
+        recipe.is_favorited = recipe.pk in favorited
+        recipe.is_in_shopping_cart = recipe.pk in in_cart
+        recipe.author_is_subscribed = recipe.author_id in followed
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Страница рецептов с флагами пользователя, собранными разом."""
+
+    def to_representation(self, data):
+        recipes = list(data)
+        set_user_flags(recipes, self.context.get('request'))
+        return super().to_representation(recipes)
+
+
+class RecipeReadSerializer(
+        ThumbnailsMixin,
+        serializers.ModelSerializer):
+    image = serializers.ImageField()
     tags = TagSerializer(
         many=True,
         read_only=True)
@@ -247,25 +360,21 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         many=True,
         required=True,
         source='recipe')
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
-
-    def __is_something(self, obj, model):
-        if not self.context['request'].user.is_authenticated:
-            return False
-
-        return model.objects.filter(
-            recipe=obj, user=self.context['request'].user).exists()
-
-    def get_is_favorited(self, obj):
-        return self.__is_something(obj, Favorite_Recipe)
-
-    def get_is_in_shopping_cart(self, obj):
-        return self.__is_something(obj, Shopping)
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = (
+            'search_document', 'search_vector', 'popularity',
+            'favorites_count', 'in_carts_count', 'thumbnails_ready')
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        if not hasattr(instance, 'is_favorited'):
+            set_user_flags([instance], self.context.get('request'))
+        instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
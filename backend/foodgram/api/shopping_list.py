@@ -0,0 +1,162 @@
+import csv
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import F
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from posts.models import ShoppingListIngredient
+
+DATE_FORMAT = '%d-%m-%Y %H:%M'
+TITLE = 'Список покупок'
+FOOTER = 'Посчитано в Foodgram'
+FONT_NAME = 'Tahoma'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'rep', 'tahoma.ttf')
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+EXPORT_FORMATS = ('txt', 'csv', 'pdf')
+EXPORT_DIR = 'shopping_lists'
+SHOPPING_LIST_CHUNK_SIZE = 500
+
+
+def get_shopping_list(user_id):
+    """Строки списка покупок пользователя, отсортированные по названию."""
+    return ShoppingListIngredient.objects.filter(user_id=user_id).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        quanty=F('amount')
+    ).order_by('ingredient__name')
+
+
+class Echo:
+    """Буфер, возвращающий записанную строку вместо хранения."""
+
+    def write(self, value):
+        return value
+
+
+def iter_txt(ingredients, created=None):
+    """Строки txt; created — дата в заголовке, у файлов выгрузки её нет."""
+    yield f'{TITLE} \n'
+    if created is not None:
+        yield f'{created.strftime(DATE_FORMAT)}\n'
+    for item in ingredients:
+        yield (
+            f' {item["ingredient__name"]} - {item["quanty"]}'
+            f'{item["ingredient__measurement_unit"]}'
+            f'\n\n'
+        )
+    yield f'\n\n{FOOTER}'
+
+
+def iter_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for item in ingredients:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['quanty'],
+            item['ingredient__measurement_unit']))
+
+
+def write_pdf(ingredients, file, created=None):
+    """Рисует список покупок в PDF постранично."""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    page = canvas.Canvas(file, pagesize=A4)
+    width, height = A4
+    page.setFont(FONT_NAME, PDF_FONT_SIZE)
+    y = height - PDF_MARGIN
+    title = TITLE
+    if created is not None:
+        title = f'{title} {created.strftime(DATE_FORMAT)}'
+    page.drawString(PDF_MARGIN, y, title)
+    y -= PDF_LINE_HEIGHT * 2
+    for item in ingredients:
+        if y < PDF_MARGIN:
+            page.showPage()
+            page.setFont(FONT_NAME, PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+        page.drawString(
+            PDF_MARGIN, y,
+            f'• {item["ingredient__name"]} - {item["quanty"]} '
+            f'{item["ingredient__measurement_unit"]}')
+        y -= PDF_LINE_HEIGHT
+    page.drawString(PDF_MARGIN, PDF_MARGIN / 2, FOOTER)
+    page.save()
+
+
+def render_pdf(ingredients, created=None):
+    """Возвращает открытый временный файл с готовым PDF.
+
+    Временный файл избавляет только от копии готового документа: сами
+    страницы reportlab держит в памяти до save(). Поэтому длинные
+    списки рендерятся фоновой выгрузкой, а не в запросе.
+    """
+    file = tempfile.TemporaryFile()
+    write_pdf(ingredients, file, created)
+    file.seek(0)
+    return file
+
+
+def get_export_dir(user_id):
+    """Каталог выгрузок пользователя; SECRET_KEY не даёт угадать имя."""
+    digest = hashlib.sha256(f'{settings.SECRET_KEY}:{user_id}'.encode())
+    return f'{EXPORT_DIR}/{digest.hexdigest()}'
+
+
+def get_export_name(user_id, export_format):
+    """Имя файла выгрузки по хэшу содержимого списка покупок.
+
+    Пока список не меняется, имя тоже не меняется, и готовый файл
+    можно отдавать повторно. Даты в таких файлах нет: она бы
+    устаревала вместе с файлом.
+    """
+    digest = hashlib.sha256(export_format.encode())
+    for row in get_shopping_list(user_id).values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'):
+        digest.update(repr(row).encode())
+    return f'{get_export_dir(user_id)}/{digest.hexdigest()}.{export_format}'
+
+
+def prune_exports(user_id, keep):
+    """Удаляет прежние выгрузки пользователя в том же формате, что keep."""
+    directory, name = keep.rsplit('/', 1)
+    _, files = default_storage.listdir(directory)
+    extension = os.path.splitext(name)[1]
+    for file in files:
+        if file != name and file.endswith(extension):
+            default_storage.delete(f'{directory}/{file}')
+
+
+def export_shopping_list(user_id, export_format):
+    """Сохраняет выгрузку списка покупок в хранилище, если её там нет.
+
+    Прежние файлы пользователя в этом формате удаляются. Возвращает
+    имя файла в хранилище.
+    """
+    name = get_export_name(user_id, export_format)
+    if default_storage.exists(name):
+        return name
+    ingredients = get_shopping_list(user_id).iterator(
+        chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+    if export_format == 'pdf':
+        file = render_pdf(ingredients)
+    else:
+        rows = iter_csv if export_format == 'csv' else iter_txt
+        file = tempfile.TemporaryFile()
+        for row in rows(ingredients):
+            file.write(row.encode('utf-8'))
+        file.seek(0)
+    with file:
+        name = default_storage.save(name, File(file))
+    prune_exports(user_id, name)
+    return name
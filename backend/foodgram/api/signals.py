@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from posts.models import Followers, Ingredient, Recipe, Tag
+
+from .cache import bump_version
+from .feed import push_recipe, reset_timeline
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags_cache(sender, **kwargs):
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients_cache(sender, **kwargs):
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: push_recipe(instance))
+
+
+@receiver(post_save, sender=Followers)
+@receiver(post_delete, sender=Followers)
+def invalidate_feed(sender, instance, **kwargs):
+    reset_timeline(instance.user_id)
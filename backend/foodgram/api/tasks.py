@@ -0,0 +1,12 @@
+from jobs.queue import task
+
+from .shopping_list import export_shopping_list
+
+
+@task('api.export_shopping_list')
+def export_shopping_list_task(user_id, export_format, file_name=None):
+    """file_name — ожидаемое имя файла, по нему повторные запросы находят
+    уже поставленную задачу; файл всё равно называется по списку на
+    момент выполнения.
+    """
+    return {'name': export_shopping_list(user_id, export_format)}
@@ -0,0 +1,322 @@
+import json
+import subprocess
+import sys
+from base64 import urlsafe_b64encode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from jobs.models import Job
+from posts.models import (Favorite, Followers, Ingredient, Recipe,
+                          RecipiesIngredients, ShoppingCart, Tag)
+from posts.search import ingredient_index
+from users.models import User
+
+from .cache import bump_version, get_version
+from .pangination import MAX_PAGE_SIZE
+
+
+class RecipeListQueriesTests(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}', first_name='Имя',
+                last_name='Фамилия', password='pass')
+            for number in range(2)]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тэг {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(2)]
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+        Followers.objects.create(user=cls.user, author=cls.authors[0])
+
+    def create_recipes(self, count):
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=self.authors[number % 2], name=f'Рецепт {number}',
+                text='Описание', cooking_time=10)
+            recipe.tags.set(self.tags)
+            RecipiesIngredients.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=5)
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def count_queries(self, client, path):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def assert_constant(self, client, path):
+        self.create_recipes(1)
+        single, _ = self.count_queries(client, path)
+        self.create_recipes(5)
+        with self.assertNumQueries(single):
+            response = client.get(path)
+        self.assertEqual(len(response.data['results']), 6)
+        return response
+
+    def test_anonymous(self):
+        response = self.assert_constant(APIClient(), '/api/recipes/')
+        recipe = response.data['results'][0]
+        self.assertFalse(recipe['is_favorited'])
+        self.assertFalse(recipe['author']['is_subscribed'])
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = self.assert_constant(client, '/api/recipes/')
+        for recipe in response.data['results']:
+            self.assertTrue(recipe['is_favorited'])
+            self.assertTrue(recipe['is_in_shopping_cart'])
+            self.assertEqual(
+                recipe['author']['is_subscribed'],
+                recipe['author']['id'] == self.authors[0].pk)
+
+    def test_authenticated_filtered(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_constant(
+            client, '/api/recipes/?is_favorited=1&is_in_shopping_cart=1')
+
+
+class ShoppingCartPDFTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Описание',
+            cooking_time=10)
+        for number in range(3):
+            RecipiesIngredients.objects.create(
+                recipe=recipe, amount=5,
+                ingredient=Ingredient.objects.create(
+                    name=f'Ингредиент {number}', measurement_unit='г'))
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_short_list_is_rendered(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    @override_settings(SHOPPING_LIST_PDF_SYNC_LIMIT=2, JOBS_EAGER=False)
+    def test_long_list_is_exported(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=pdf')
+        job = Job.objects.get()
+        self.assertRedirects(
+            response,
+            f'/api/recipes/download_shopping_cart/exports/{job.pk}/',
+            fetch_redirect_response=False)
+
+    @override_settings(JOBS_EAGER=False)
+    def test_pending_export_is_reused(self):
+        ids = {
+            self.client.post(
+                '/api/recipes/download_shopping_cart/exports/',
+                {'format': 'csv'}).data['id']
+            for _ in range(3)}
+        self.assertEqual(ids, {Job.objects.get().pk})
+        Job.objects.update(status=Job.FAILED)
+        response = self.client.post(
+            '/api/recipes/download_shopping_cart/exports/',
+            {'format': 'csv'})
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertEqual(response.data['status'], Job.QUEUED)
+
+
+class CachedResponseTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+
+    def test_not_modified(self):
+        response = self.client.get('/api/ingredients/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_bump_version(self):
+        etag = self.client.get('/api/ingredients/')['ETag']
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Сахар', measurement_unit='г')])
+        response = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        bump_version('ingredients')
+        response = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['name'] for item in response.data], ['Сахар', 'Соль'])
+
+    def test_bump_from_other_process(self):
+        """Версию сбрасывают management-команды в своих процессах."""
+        version = get_version('ingredients')
+        subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             'from api.cache import bump_version; '
+             'bump_version("ingredients")'],
+            cwd=settings.BASE_DIR, check=True)
+        self.assertNotEqual(get_version('ingredients'), version)
+
+
+class IngredientSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Соль {number:03}', measurement_unit='г')
+            for number in range(150))
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+
+    def search(self, path):
+        response = APIClient().get(path)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data]
+
+    @override_settings(INGREDIENT_SEARCH_MAX_LIMIT=100)
+    def test_limit_is_capped(self):
+        self.assertEqual(
+            len(self.search('/api/ingredients/?name=соль&limit=100000')),
+            100)
+
+    @override_settings(INGREDIENT_INDEX_MAX_SIZE=100)
+    def test_large_catalog_uses_database(self):
+        self.assertIsNone(ingredient_index.search('соль', 5))
+        self.assertEqual(
+            self.search('/api/ingredients/?name=ль 00&limit=3'),
+            ['Соль 000', 'Соль 001', 'Соль 002'])
+
+
+class RecipePaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}', first_name='Имя',
+                last_name='Фамилия', password='pass')
+            for number in range(2)]
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.authors[number % 2], name=f'Рецепт {number}',
+                text='Описание', cooking_time=10)
+            for number in range(MAX_PAGE_SIZE + 5))
+        # Половина рецептов с одинаковой датой: порядок решает id.
+        Recipe.objects.filter(
+            pk__lte=Recipe.objects.order_by('id')[50].pk
+        ).update(pub_date=timezone.now())
+        Followers.objects.create(user=cls.user, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, path, link='next'):
+        ids = []
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            path = response.data[link]
+        return ids, response
+
+    def expected(self, **filters):
+        return list(Recipe.objects.filter(**filters).order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+
+    def test_keyset_walk(self):
+        ids, response = self.walk('/api/recipes/?cursor=&limit=7')
+        self.assertEqual(ids, self.expected())
+        last_page = [recipe['id'] for recipe in response.data['results']]
+        ids, _ = self.walk(response.data['previous'], link='previous')
+        self.assertCountEqual(ids + last_page, self.expected())
+
+    def test_keyset_with_filter(self):
+        author = self.authors[1]
+        ids, _ = self.walk(f'/api/recipes/?cursor=&limit=9&author={author.pk}')
+        self.assertEqual(ids, self.expected(author=author))
+
+    def test_invalid_cursor(self):
+        bad_date = urlsafe_b64encode(
+            json.dumps([0, ['вчера', 1]]).encode()).decode()
+        for cursor in ('мусор', 'W10=', bad_date):
+            response = self.client.get(f'/api/recipes/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404, cursor)
+        response = self.client.get('/api/recipes/feed/?cursor=0')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_capped(self):
+        for path in (
+                '/api/recipes/?limit=1000000',
+                '/api/recipes/?cursor=&limit=1000000',
+                '/api/recipes/feed/?limit=1000000'):
+            response = self.client.get(path)
+            self.assertLessEqual(
+                len(response.data['results']), MAX_PAGE_SIZE, path)
+        self.assertEqual(len(response.data['results']), 53)
+
+    def test_timeline_walk(self):
+        ids, _ = self.walk('/api/recipes/feed/?limit=10')
+        self.assertEqual(ids, self.expected(author=self.authors[0]))
+
+
+class SubscribeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                first_name='Имя', last_name='Фамилия', password='pass')
+            for name in ('user', 'author'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unsubscribe(self):
+        path = f'/api/users/{self.author.pk}/subscribe/'
+        self.assertEqual(self.client.delete(path).status_code, 400)
+        Followers.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.client.delete(path).status_code, 204)
+        self.assertFalse(Followers.objects.exists())
+
+    def test_unsubscribe_unknown_author(self):
+        response = self.client.delete(
+            f'/api/users/{self.author.pk + 100}/subscribe/')
+        self.assertEqual(response.status_code, 404)
@@ -1,35 +1,89 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
-from django.db.models.aggregates import Count, Sum
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, F, Prefetch
 from django.db.models.expressions import Exists, OuterRef, Value
-from django.http.response import HttpResponse
-from django.shortcuts import get_object_or_404
+from django.http.response import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
 from django.utils import timezone
+from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import generics, status, viewsets
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import (SAFE_METHODS, AllowAny,
                                         IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST
 
-from posts.models import (Followers, Ingredient, Recipe, RecipiesIngredients,
-                          Tag)
+from jobs.models import Job
+from jobs.queue import enqueue
+from posts.models import (Favorite, Followers, Ingredient, Recipe,
+                          RecipiesIngredients, ShoppingCart, Tag)
+from posts.search import ingredient_index
 from users.models import User
 
-from .filters import IngredientFilter
-from .mixins import PermissionAndPaginationMixin
-from .pangination import LimitPage
+from .feed import get_timeline
+from .filters import (IngredientFilter, RecipeOrderingFilter,
+                      RecipeSearchFilter, RecipeTagsFilter)
+from .mixins import CachedResponseMixin, PermissionAndPaginationMixin
+from .pangination import LimitPage, TimelinePagination
+from .renderers import (CSVShoppingListRenderer, PDFShoppingListRenderer,
+                        TextShoppingListRenderer)
 from .serializers import (FollowersSerializer, IngredientSerializer,
                           RecipeReadSerializer, RecipeWriteSerializer,
                           SubscribeRecipeSerializer, TagSerializer,
                           TokenSerializer, UserCreateSerializer,
                           UserListSerializer, UserPasswordSerializer)
+from .shopping_list import (EXPORT_FORMATS, SHOPPING_LIST_CHUNK_SIZE,
+                            get_export_name, get_shopping_list, iter_csv,
+                            iter_txt, render_pdf)
 
 IN_CART = ('1', 'true',)
 NOT_IN_CART = ('0', 'false',)
-DATE_FORMAT = '%d-%m-%Y %H:%M'
+
+
+def get_recipes_limit(request):
+    """Значение recipes_limit из запроса или None."""
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return max(limit, 0)
+
+
+def start_export(user_id, export_format):
+    """Возвращает (имя готового файла, None) или (None, задачу выгрузки).
+
+    Пока выгрузка того же списка ждёт в очереди или выполняется,
+    повторные запросы получают эту же задачу.
+    """
+    name = get_export_name(user_id, export_format)
+    if default_storage.exists(name):
+        return name, None
+    job = enqueue(
+        'api.export_shopping_list', unique=True,
+        user_id=user_id, export_format=export_format, file_name=name)
+    job.refresh_from_db()
+    if job.status == Job.DONE:
+        return json.loads(job.result)['name'], None
+    return None, job
+
+
+def get_export_status(job, request):
+    """Статус задачи выгрузки списка покупок для ответа API."""
+    data = {'id': job.pk, 'status': job.status, 'url': None}
+    if job.status == Job.DONE:
+        data['url'] = request.build_absolute_uri(
+            default_storage.url(json.loads(job.result)['name']))
+    elif job.status == Job.FAILED:
+        data['errors'] = 'Не удалось подготовить файл.'
+    return data
 
 
 class RecipesViewSet(viewsets.ModelViewSet):
@@ -38,6 +92,9 @@ class RecipesViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = LimitPage
+    filter_backends = (
+        DjangoFilterBackend, RecipeTagsFilter, RecipeSearchFilter,
+        RecipeOrderingFilter)
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -47,80 +104,165 @@ class RecipesViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Получает queryset в соответствии с параметрами запроса."""
         queryset = self.queryset
-        tags = self.request.query_params.getlist('tags')
-        if tags:
-            queryset = queryset.filter(
-                tags__slug__in=tags).distinct()
-
+        if self.request.method in SAFE_METHODS:
+            queryset = self.get_read_queryset(queryset)
         author = self.request.query_params.get('author')
         if author:
             queryset = queryset.filter(author=author)
 
         user = self.request.user
-        if user.is_anonymous:
-            return queryset
-        is_in_shopping = self.request.query_params.get('is_in_shopping_cart')
-        if is_in_shopping in IN_CART:
-            queryset = queryset.filter(shopping_cart=user.id)
-        elif is_in_shopping in NOT_IN_CART:
-            queryset = queryset.exclude(shopping_cart=user.id)
-
-        is_favorited = self.request.query_params.get('is_favorited')
-        if is_favorited in IN_CART:
-            queryset = queryset.filter(favorite_recipe=user.id)
-        if is_favorited in NOT_IN_CART:
-            queryset = queryset.exclude(favorite_recipe=user.id)
+        for param, model in (
+                ('is_favorited', Favorite),
+                ('is_in_shopping_cart', ShoppingCart)):
+            value = self.request.query_params.get(param)
+            if value not in IN_CART + NOT_IN_CART:
+                continue
+            if user.is_anonymous:
+                if value in IN_CART:
+                    queryset = queryset.none()
+                continue
+            marked = model.objects.filter(user=user).values('recipe_id')
+            if value in IN_CART:
+                queryset = queryset.filter(pk__in=marked)
+            else:
+                queryset = queryset.exclude(pk__in=marked)
         return queryset
 
+    def get_read_queryset(self, queryset):
+        """Подгружает автора, тэги и ингредиенты без поисковых документов.
+
+        Флаги избранного, корзины и подписки считаются уже для страницы,
+        в RecipeListSerializer, чтобы не попадать в COUNT(*).
+        """
+        return queryset.select_related('author').defer(
+            'search_document', 'search_vector'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=RecipiesIngredients.objects.select_related(
+                    'ingredient')))
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     @action(
         detail=False,
-        methods=['get'],
         permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь."""
+
+        paginator = TimelinePagination()
+        page = paginator.paginate_queryset(
+            get_timeline(request.user.id), request, self)
+        recipes = self.get_queryset().in_bulk(page)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in page if pk in recipes], many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            TextShoppingListRenderer,
+            CSVShoppingListRenderer,
+            PDFShoppingListRenderer))
     def download_shopping_cart(self, request):
-        """Загружает файл *.txt со списком покупок."""
+        """Отдаёт список покупок потоком в формате txt, csv или pdf.
+
+        reportlab держит в памяти все страницы PDF до сохранения, поэтому
+        длинные списки в PDF собираются фоновой выгрузкой: ответ
+        перенаправляет на готовый файл или на статус задачи.
+        """
 
-        if not request.user.shopping_cart.recipe.exists():
+        shopping_list = get_shopping_list(request.user.id)
+        size = shopping_list.count()
+        if not size:
             return Response(status=HTTP_400_BAD_REQUEST)
-        ingredient = RecipiesIngredients.objects.filter(
-            recipe__in=(self.request.user.shopping_cart.recipe.values('id'))
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(quanty=Sum('amount')).order_by()
-        filename = f'{request.user.username}_shopping_list.txt'
-        shopping_list = (
-            f'Список покупок \n'
-            f'{timezone.now().strftime(DATE_FORMAT)}\n'
-        )
-        for recipe in ingredient:
-            shopping_list += (
-                f' {recipe["ingredient__name"]} - {recipe["quanty"]}'
-                f'{recipe["ingredient__measurement_unit"]}'
-                f'\n\n'
-            )
-
-        shopping_list += '\n\nПосчитано в Foodgram'
-
-        response = HttpResponse(
-            shopping_list, content_type='text.txt; charset=utf-8'
-        )
+        renderer = request.accepted_renderer
+        if (renderer.format == 'pdf'
+                and size > settings.SHOPPING_LIST_PDF_SYNC_LIMIT):
+            name, job = start_export(request.user.id, renderer.format)
+            if job is None:
+                return redirect(default_storage.url(name))
+            return redirect(
+                'api:recipes-export-shopping-cart-status', job_id=job.pk)
+        ingredients = shopping_list.iterator(
+            chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+        if renderer.format == 'pdf':
+            response = FileResponse(
+                render_pdf(ingredients, timezone.now()),
+                content_type=renderer.media_type)
+        else:
+            rows = (
+                iter_csv(ingredients) if renderer.format == 'csv'
+                else iter_txt(ingredients, timezone.now()))
+            response = StreamingHttpResponse(
+                rows,
+                content_type=f'{renderer.media_type}; charset=utf-8')
+        filename = f'{request.user.username}_shopping_list.{renderer.format}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=(IsAuthenticated,),
+        url_path='download_shopping_cart/exports')
+    def export_shopping_cart(self, request):
+        """Заказывает файл списка покупок в фоне.
+
+        Если файл для такого же списка уже готов, ссылка на него
+        отдаётся сразу.
+        """
+
+        export_format = request.data.get('format', 'pdf')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'errors': 'Формат должен быть одним из: '
+                           f'{", ".join(EXPORT_FORMATS)}.'},
+                status=HTTP_400_BAD_REQUEST)
+        if not request.user.shopping_list.exists():
+            return Response(status=HTTP_400_BAD_REQUEST)
+        name, job = start_export(request.user.id, export_format)
+        if job is None:
+            return Response({
+                'id': None,
+                'status': Job.DONE,
+                'url': request.build_absolute_uri(default_storage.url(name)),
+            })
+        return Response(
+            get_export_status(job, request),
+            status=status.HTTP_202_ACCEPTED)
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        url_path=r'download_shopping_cart/exports/(?P<job_id>\d+)')
+    def export_shopping_cart_status(self, request, job_id):
+        """Статус фоновой выгрузки и ссылка на готовый файл."""
+
+        job = get_object_or_404(
+            Job, pk=job_id, task='api.export_shopping_list')
+        if json.loads(job.payload).get('user_id') != request.user.id:
+            raise NotFound
+        return Response(get_export_status(job, request))
+
 
 class TagsViewSet(
+        CachedResponseMixin,
         PermissionAndPaginationMixin,
         viewsets.ModelViewSet):
     """Список тэгов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_namespace = 'tags'
 
 
 class IngredientsViewSet(
+        CachedResponseMixin,
         PermissionAndPaginationMixin,
         viewsets.ModelViewSet):
     """Список ингредиентов."""
@@ -128,24 +270,42 @@ class IngredientsViewSet(
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filterset_class = IngredientFilter
+    cache_namespace = 'ingredients'
+
+    def get_limit(self, default):
+        try:
+            limit = int(self.request.query_params['limit'])
+        except (KeyError, ValueError):
+            return default
+        if limit <= 0:
+            return default
+        return min(limit, settings.INGREDIENT_SEARCH_MAX_LIMIT)
+
+    def list(self, request, *args, **kwargs):
+        """Подсказки по названию берутся из индекса в памяти.
+
+        Если индекс выключен или каталог для него слишком велик, поиск
+        идёт в базе.
+        """
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = self.get_limit(settings.INGREDIENT_SEARCH_LIMIT)
+        if settings.INGREDIENT_INDEX_ENABLED:
+            results = ingredient_index.search(name, limit)
+            if results is not None:
+                return Response(results)
+        queryset = self.filter_queryset(self.get_queryset())[:limit]
+        return Response(self.get_serializer(queryset, many=True).data)
 
 
 class AddAndDeleteSubscribe(
-        generics.RetrieveDestroyAPIView,
-        generics.ListCreateAPIView):
+        generics.CreateAPIView,
+        generics.DestroyAPIView):
     """Подписка и отписка от пользователя."""
 
     serializer_class = FollowersSerializer
 
-    def get_queryset(self):
-        return self.request.user.follower.select_related(
-            'following'
-        ).prefetch_related(
-            'following__recipe'
-        ).annotate(
-            recipes_count=Count('following__recipe'),
-            is_subscribed=Value(True), )
-
     def get_object(self):
         user_id = self.kwargs['user_id']
         user = get_object_or_404(User, id=user_id)
@@ -158,14 +318,34 @@ class AddAndDeleteSubscribe(
             return Response(
                 {'errors': 'На самого себя не подписаться!'},
                 status=status.HTTP_400_BAD_REQUEST)
-        if request.user.follower.filter(author=instance).exists():
+        try:
+            with transaction.atomic():
+                subs = Followers.objects.create(
+                    user=request.user, author=instance)
+        except IntegrityError:
             return Response(
                 {'errors': 'Уже подписан!'},
                 status=status.HTTP_400_BAD_REQUEST)
-        subs = request.user.follower.create(author=instance)
-        serializer = self.get_serializer(subs)
+        subs.recipes_count = instance.recipes_count
+        subs.is_subscribed = True
+        previews = Recipe.objects.previews(
+            [instance.id], get_recipes_limit(request))
+        serializer = self.get_serializer_class()(
+            subs,
+            context={
+                **self.get_serializer_context(),
+                'recipes_previews': previews})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        deleted, _ = request.user.follower.filter(author=instance).delete()
+        if not deleted:
+            return Response(
+                {'errors': 'Вы не подписаны на этого пользователя!'},
+                status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class UsersViewSet(UserViewSet):
     """Пользователи."""
@@ -198,11 +378,19 @@ class UsersViewSet(UserViewSet):
     def subscriptions(self, request):
         """Получить на кого пользователь подписан."""
 
-        queryset = Followers.objects.filter(user=request.user)
+        queryset = Followers.objects.filter(
+            user=request.user
+        ).select_related('author').annotate(
+            recipes_count=F('author__recipes_count'),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('-created', '-id')
         pages = self.paginate_queryset(queryset)
+        previews = Recipe.objects.previews(
+            [subscription.author_id for subscription in pages],
+            get_recipes_limit(request))
         serializer = FollowersSerializer(
             pages, many=True,
-            context={'request': request})
+            context={'request': request, 'recipes_previews': previews})
         return self.get_paginated_response(serializer.data)
 
 
@@ -211,6 +399,7 @@ class GetObjectMixin:
 
     serializer_class = SubscribeRecipeSerializer
     permission_classes = (AllowAny,)
+    model = None
 
     def get_object(self):
         recipe_id = self.kwargs['recipe_id']
@@ -219,6 +408,16 @@ class GetObjectMixin:
 
         return recipe
 
+    def create(self, request, *args, **kwargs):
+        instance = self.get_object()
+        self.model.objects.get_or_create(user=request.user, recipe=instance)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_destroy(self, instance):
+        self.model.objects.filter(
+            user=self.request.user, recipe=instance).delete()
+
 
 class AddDeleteShoppingCart(
         GetObjectMixin,
@@ -227,14 +426,7 @@ class AddDeleteShoppingCart(
 ):
     """Добавление и удаление рецепта в/из корзины."""
 
-    def create(self, request, *args, **kwargs):
-        instance = self.get_object()
-        request.user.shopping_cart.recipe.add(instance)
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-    def perform_destroy(self, instance):
-        self.request.user.shopping_cart.recipe.remove(instance)
+    model = ShoppingCart
 
 
 class AddDeleteFavoriteRecipe(
@@ -244,14 +436,7 @@ class AddDeleteFavoriteRecipe(
 ):
     """Добавление и удаление рецепта в/из избранных."""
 
-    def create(self, request, *args, **kwargs):
-        instance = self.get_object()
-        request.user.favorite_recipe.recipe.add(instance)
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-    def perform_destroy(self, instance):
-        self.request.user.favorite_recipe.recipe.remove(instance)
+    model = Favorite
 
 
 class AuthToken(ObtainAuthToken):
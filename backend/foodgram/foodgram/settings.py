@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -26,6 +27,7 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'api.apps.ApiConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
     'djoser',
     'rest_framework',
     'rest_framework.authtoken',
@@ -78,6 +80,22 @@ DATABASES = {
 }
 
 
+# Версии кэша ответов и ленты сбрасывают и процессы gunicorn, и
+# management-команды, поэтому кэш по умолчанию общий для всех процессов
+# контейнера. Для нескольких серверов стоит задать memcached или redis.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram-cache')),
+    }
+}
+
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -126,5 +144,33 @@ REST_FRAMEWORK = {
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+INGREDIENT_INDEX_ENABLED = True
+INGREDIENT_INDEX_TTL = 300
+INGREDIENT_INDEX_MAX_SIZE = 50000
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+TAG_IDS_TTL = 300
+RECIPE_INDEX_TTL = 300
+SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_MAX_RESULTS = 1000
+POPULARITY_FAVORITE_WEIGHT = 1.0
+POPULARITY_CART_WEIGHT = 2.0
+POPULARITY_HALF_LIFE = 24 * 7
+POPULARITY_WINDOW = POPULARITY_HALF_LIFE * 8
+FEED_SIZE = 500
+FEED_TIMEOUT = 60 * 15
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+THUMBNAIL_QUALITY = 80
+SHOPPING_LIST_PDF_SYNC_LIMIT = 400
+JOBS_EAGER = os.getenv('JOBS_EAGER', default='False') == 'True'
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_DELAY = 10
+JOBS_VISIBILITY_TIMEOUT = 60 * 5
+JOBS_POLL_INTERVAL = 1.0
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Картинки рецептов сохраняются из временных файлов с правами 0600, а
+# nginx отдаёт /media/ не от root.
+FILE_UPLOAD_PERMISSIONS = 0o644
+FILE_UPLOAD_DIRECTORY_PERMISSIONS = 0o755
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobs.queue import purge
+
+
+class Command(BaseCommand):
+    help = ('Удаляет выполненные и упавшие фоновые задачи, завершённые '
+            'раньше заданного срока')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge(
+            timezone.now() - timedelta(days=options['days']),
+            options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено задач: {deleted}'))
@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import signal
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+
+from jobs.queue import claim, execute
+
+
+def work(stop, worker, poll_interval, once):
+    """Цикл одного потока: забрать задачу, выполнить, повторить."""
+    try:
+        while not stop.is_set():
+            job = claim(worker)
+            if job is None:
+                if once:
+                    return
+                stop.wait(poll_interval)
+                continue
+            try:
+                execute(job)
+            finally:
+                close_old_connections()
+    finally:
+        connection.close()
+
+
+def run_process(threads, poll_interval, once):
+    """Запускает потоки-обработчики и ждёт их до SIGTERM/SIGINT."""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    prefix = f'{os.getpid()}-{uuid.uuid4().hex[:6]}'
+    pool = [
+        threading.Thread(
+            target=work,
+            args=(stop, f'{prefix}-{number}', poll_interval, once),
+            name=f'jobs-worker-{number}')
+        for number in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        while thread.is_alive():
+            thread.join(poll_interval)
+
+
+class Command(BaseCommand):
+    help = ('Обработчики фоновых задач: processes процессов '
+            'по threads потоков')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=2)
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+            help='Пауза в секундах, когда очередь пуста.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать доступные задачи и завершиться.')
+
+    def handle(self, *args, **options):
+        worker_args = (
+            options['threads'], options['poll_interval'], options['once'])
+        if options['processes'] <= 1:
+            run_process(*worker_args)
+            return
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=run_process, args=worker_args)
+            for _ in range(options['processes'])]
+        for process in processes:
+            process.start()
+
+        def terminate(*args):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, terminate)
+        signal.signal(signal.SIGINT, terminate)
+        for process in processes:
+            process.join()
@@ -0,0 +1,76 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди на базе данных."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    task = models.CharField(
+        'Задача',
+        max_length=200)
+    payload = models.TextField(
+        'Аргументы (JSON)',
+        default='{}')
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUSES,
+        default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(
+        'Попыток',
+        default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток',
+        default=3)
+    available_at = models.DateTimeField(
+        'Доступна с',
+        default=timezone.now)
+    locked_until = models.DateTimeField(
+        'Занята до',
+        null=True,
+        blank=True)
+    locked_by = models.CharField(
+        'Обработчик',
+        max_length=64,
+        blank=True)
+    result = models.TextField(
+        'Результат (JSON)',
+        blank=True)
+    last_error = models.TextField(
+        'Последняя ошибка',
+        blank=True)
+    created = models.DateTimeField(
+        'Создана',
+        auto_now_add=True)
+    finished_at = models.DateTimeField(
+        'Завершена',
+        null=True,
+        blank=True)
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('-id',)
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                name='job_queued_idx',
+                condition=models.Q(status='queued')),
+            models.Index(
+                fields=['locked_until'],
+                name='job_running_idx',
+                condition=models.Q(status='running'))]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.status})'
@@ -0,0 +1,150 @@
+import json
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name, max_attempts=None):
+    """Регистрирует функцию как фоновую задачу с именем name.
+
+    Аргументы задачи передаются именованными и должны сериализоваться
+    в JSON; возвращаемое значение сохраняется в Job.result.
+    """
+    def decorator(func):
+        TASKS[name] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, delay=0, unique=False, **payload):
+    """Ставит задачу в очередь и возвращает Job.
+
+    Строка очереди пишется в текущей транзакции, поэтому обработчики
+    увидят задачу только после коммита. При JOBS_EAGER задача
+    выполняется сразу после коммита в этом же процессе, без задержки.
+    С unique=True вместо новой задачи возвращается ещё не завершённая
+    задача с тем же именем и аргументами, если она есть.
+    """
+    if name not in TASKS:
+        raise KeyError(f'Неизвестная задача: {name}')
+    payload = json.dumps(payload, default=str, sort_keys=True)
+    if unique:
+        job = Job.objects.filter(
+            task=name, payload=payload,
+            status__in=(Job.QUEUED, Job.RUNNING)).order_by('id').first()
+        if job is not None:
+            return job
+    max_attempts = TASKS[name][1] or settings.JOBS_MAX_ATTEMPTS
+    if settings.JOBS_EAGER:
+        delay = 0
+    job = Job.objects.create(
+        task=name,
+        payload=payload,
+        max_attempts=max_attempts,
+        available_at=timezone.now() + timedelta(seconds=delay))
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: run_job(job.pk))
+    return job
+
+
+def get_claimable(now):
+    """Задачи в очереди и задачи, чей обработчик не уложился в таймаут."""
+    return (
+        Q(status=Job.QUEUED, available_at__lte=now)
+        | Q(status=Job.RUNNING, locked_until__lt=now))
+
+
+def claim(worker, job_ids=None):
+    """Забирает одну доступную задачу или возвращает None.
+
+    Захват — условный UPDATE по той же выборке, так что задачу получает
+    ровно один обработчик без блокировок строк.
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(get_claimable(now))
+    if job_ids is not None:
+        candidates = candidates.filter(pk__in=job_ids)
+    for pk in candidates.order_by(
+            'available_at', 'id').values_list('pk', flat=True)[:10]:
+        claimed = Job.objects.filter(get_claimable(now), pk=pk).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=now + timedelta(
+                seconds=settings.JOBS_VISIBILITY_TIMEOUT),
+            locked_by=worker)
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def execute(job):
+    """Выполняет захваченную задачу и сохраняет итог.
+
+    При ошибке задача возвращается в очередь с экспоненциальной
+    задержкой, пока не кончатся попытки.
+    """
+    owned = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    func = TASKS.get(job.task, (None,))[0]
+    if func is None or job.attempts > job.max_attempts:
+        owned.update(
+            status=Job.FAILED, locked_until=None,
+            finished_at=timezone.now(),
+            last_error=(
+                f'Неизвестная задача: {job.task}' if func is None
+                else 'Превышен таймаут обработки.'))
+        return False
+    try:
+        result = func(**json.loads(job.payload))
+    except Exception:
+        logger.exception('Задача %s #%s упала', job.task, job.pk)
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            owned.update(
+                status=Job.FAILED, locked_until=None, last_error=error,
+                finished_at=timezone.now())
+        else:
+            delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            owned.update(
+                status=Job.QUEUED, locked_until=None, locked_by='',
+                last_error=error,
+                available_at=timezone.now() + timedelta(seconds=delay))
+        return False
+    owned.update(
+        status=Job.DONE, locked_until=None, finished_at=timezone.now(),
+        result='' if result is None else json.dumps(result, default=str))
+    return True
+
+
+def run_job(job_id):
+    """Сразу выполняет задачу job_id, если её ещё никто не забрал."""
+    job = claim(f'eager-{uuid.uuid4().hex[:8]}', job_ids=[job_id])
+    if job is not None:
+        execute(job)
+
+
+def purge(before, batch_size=1000):
+    """Удаляет выполненные и упавшие задачи, завершённые до before.
+
+    Удаляет пачками по id, чтобы не держать долгих блокировок;
+    возвращает число удалённых задач.
+    """
+    finished = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED), finished_at__lt=before)
+    deleted = 0
+    while True:
+        batch = list(finished.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += Job.objects.filter(pk__in=batch).delete()[0]
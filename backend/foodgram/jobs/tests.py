@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim, enqueue, execute, purge, task
+
+FAILING_TASK = 'jobs.tests.fail'
+
+
+@task(FAILING_TASK, max_attempts=2)
+def fail():
+    raise ValueError('Ошибка')
+
+
+@override_settings(JOBS_EAGER=False, JOBS_RETRY_DELAY=10)
+class QueueTests(TestCase):
+
+    def setUp(self):
+        self.job = enqueue(FAILING_TASK)
+
+    def make_available(self):
+        Job.objects.filter(pk=self.job.pk).update(
+            available_at=timezone.now())
+
+    def test_retry_until_max_attempts(self):
+        execute(claim('worker'))
+        self.job.refresh_from_db()
+        self.assertEqual(
+            (self.job.status, self.job.attempts), (Job.QUEUED, 1))
+        self.assertIn('ValueError', self.job.last_error)
+        self.assertGreater(self.job.available_at, timezone.now())
+        self.assertIsNone(claim('worker'))
+        self.make_available()
+        execute(claim('worker'))
+        self.job.refresh_from_db()
+        self.assertEqual(
+            (self.job.status, self.job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(self.job.finished_at)
+
+    def test_claimed_once(self):
+        self.assertEqual(claim('first').pk, self.job.pk)
+        self.assertIsNone(claim('second'))
+
+    def test_reclaim_stale_running(self):
+        stale = claim('first')
+        Job.objects.filter(pk=self.job.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+        job = claim('second')
+        self.assertEqual(
+            (job.pk, job.attempts, job.locked_by),
+            (self.job.pk, 2, 'second'))
+        execute(stale)
+        self.job.refresh_from_db()
+        self.assertEqual(
+            (self.job.status, self.job.locked_by), (Job.RUNNING, 'second'))
+
+    def test_timed_out_after_max_attempts(self):
+        Job.objects.filter(pk=self.job.pk).update(
+            status=Job.RUNNING, attempts=2,
+            locked_until=timezone.now() - timedelta(seconds=1))
+        execute(claim('worker'))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, Job.FAILED)
+        self.assertEqual(self.job.last_error, 'Превышен таймаут обработки.')
+
+    def test_purge(self):
+        now = timezone.now()
+        old, recent = (
+            Job.objects.create(
+                task=FAILING_TASK, status=status, finished_at=finished_at)
+            for status, finished_at in (
+                (Job.DONE, now - timedelta(days=8)),
+                (Job.FAILED, now - timedelta(days=1))))
+        self.assertEqual(purge(now - timedelta(days=7), batch_size=1), 1)
+        self.assertEqual(
+            set(Job.objects.values_list('pk', flat=True)),
+            {self.job.pk, recent.pk})
@@ -1,10 +1,17 @@
 from django.contrib import admin
-
-from .models import (Favorite_Recipe, Followers, Ingredient, Recipe, Shopping,
-                     Tag)
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.db.models import Prefetch, Q
+from django.http import JsonResponse
+from django.utils.text import smart_split, unescape_string_literal
+
+from .models import (Favorite, Followers, Ingredient, Recipe,
+                     RecipiesIngredients, ShoppingCart,
+                     ShoppingListIngredient, Tag)
 from .permision import RecipeIngredientAdmin
+from .thumbnails import schedule_thumbnails
 
 EMPTY_MSG = '-пусто-'
+AUTOCOMPLETE_PAGE_SIZE = 10
 
 
 if not hasattr(admin, "display"):
@@ -22,12 +29,61 @@ class RecipeAdmin(admin.ModelAdmin):
         'id', 'get_author', 'name', 'text',
         'cooking_time', 'get_tags', 'get_ingredients',
         'pub_date', 'get_favorite_count')
-    search_fields = (
-        'name', 'cooking_time',
-        'author__email', 'ingredients__name')
+    search_fields = ('name', 'author__email', 'ingredients__name')
     list_filter = ('pub_date', 'tags',)
     inlines = (RecipeIngredientAdmin,)
     empty_value_display = EMPTY_MSG
+    list_per_page = 50
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=RecipiesIngredients.objects.select_related(
+                    'ingredient')))
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по рецепту, автору и ингредиентам без DISTINCT.
+
+        Ингредиенты ищутся подзапросом по id рецептов, а не JOIN'ом,
+        поэтому строки не размножаются.
+        """
+        for word in smart_split(search_term):
+            if word[:1] in ('"', "'") and word[-1:] == word[:1]:
+                word = unescape_string_literal(word)
+            condition = (
+                Q(name__icontains=word)
+                | Q(author__email__icontains=word)
+                | Q(pk__in=RecipiesIngredients.objects.filter(
+                    ingredient__name__icontains=word).values('recipe_id')))
+            if word.isdigit():
+                condition |= Q(cooking_time=word)
+            queryset = queryset.filter(condition)
+        return queryset, False
+
+    def save_model(self, request, obj, form, change):
+        """Новая картинка рецепта отправляется на нарезку превью."""
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            obj.thumbnails_ready = False
+        super().save_model(request, obj, form, change)
+        if image_changed:
+            schedule_thumbnails(obj)
+
+    def save_related(self, request, form, formsets, change):
+        """После сохранения ингредиентов пересобирает поисковый документ
+        и переносит изменение состава в списки покупок.
+        """
+        recipe = form.instance
+        old_amounts = dict(
+            recipe.recipe.values_list('ingredient_id', 'amount'))
+        super().save_related(request, form, formsets, change)
+        ShoppingListIngredient.objects.change_recipe(recipe, old_amounts)
+        Recipe.objects.filter(pk=recipe.pk).update_search_documents()
 
     @admin.display(
         description='Электронная почта автора')
@@ -42,15 +98,13 @@ class RecipeAdmin(admin.ModelAdmin):
     @admin.display(description=' Ингредиенты')
     def get_ingredients(self, obj):
         return '\n '.join([
-            f'{item["ingredient__name"]} - {item["amount"]}'
-            f' {item["ingredient__measurement_unit"]}.'
-            for item in obj.recipe.values(
-                'ingredient__name',
-                'amount', 'ingredient__measurement_unit')])
+            f'{item.ingredient.name} - {item.amount}'
+            f' {item.ingredient.measurement_unit}.'
+            for item in obj.recipe.all()])
 
     @admin.display(description='В избранном')
     def get_favorite_count(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
 
 @admin.register(Tag)
@@ -61,14 +115,50 @@ class TagAdmin(admin.ModelAdmin):
     empty_value_display = EMPTY_MSG
 
 
+class IngredientAutocompleteView(AutocompleteJsonView):
+    """Подсказки небольшими страницами без COUNT(*) по всему каталогу.
+
+    Следующая страница определяется по лишней строке в выборке.
+    """
+
+    paginate_by = AUTOCOMPLETE_PAGE_SIZE
+
+    def get(self, request, *args, **kwargs):
+        if not self.has_perm(request):
+            return JsonResponse({'error': '403 Forbidden'}, status=403)
+        self.term = request.GET.get('term', '')
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        start = (page - 1) * self.paginate_by
+        objects = list(
+            self.get_queryset()[start:start + self.paginate_by + 1])
+        return JsonResponse({
+            'results': [
+                {'id': str(obj.pk), 'text': str(obj)}
+                for obj in objects[:self.paginate_by]],
+            'pagination': {'more': len(objects) > self.paginate_by},
+        })
+
+
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'name', 'measurement_unit',)
-    search_fields = (
-        'name', 'measurement_unit',)
+    search_fields = ('name',)
     empty_value_display = EMPTY_MSG
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по названию, начало названия — выше остальных."""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
+
+    def autocomplete_view(self, request):
+        return IngredientAutocompleteView.as_view(model_admin=self)(request)
+
 
 @admin.register(Followers)
 class SubscribeAdmin(admin.ModelAdmin):
@@ -79,36 +169,21 @@ class SubscribeAdmin(admin.ModelAdmin):
     empty_value_display = EMPTY_MSG
 
 
-@admin.register(Favorite_Recipe)
+@admin.register(Favorite)
 class FavoriteRecipeAdmin(admin.ModelAdmin):
     list_display = (
-        'id', 'user', 'get_recipe', 'get_count')
+        'id', 'user', 'recipe', 'created')
+    list_select_related = ('user', 'recipe__author')
+    search_fields = ('user__email', 'recipe__name')
+    raw_id_fields = ('user', 'recipe')
     empty_value_display = EMPTY_MSG
 
-    @admin.display(
-        description='Рецепты')
-    def get_recipe(self, obj):
-        return [
-            f'{item["name"]} ' for item in obj.recipe.values('name')[:5]]
-
-    @admin.display(
-        description='В избранных')
-    def get_count(self, obj):
-        return obj.recipe.count()
-
 
-@admin.register(Shopping)
+@admin.register(ShoppingCart)
 class SoppingCartAdmin(admin.ModelAdmin):
     list_display = (
-        'id', 'user', 'recipe')
+        'id', 'user', 'recipe', 'created')
+    list_select_related = ('user', 'recipe__author')
+    search_fields = ('user__email', 'recipe__name')
+    raw_id_fields = ('user', 'recipe')
     empty_value_display = EMPTY_MSG
-
-    @admin.display(description='Рецепты')
-    def recipe(self, obj):
-        print(obj.recipe.values)
-        return [
-            f'{item["name"]} ' for item in obj.recipe.values('name')[:5]]
-
-    @admin.display(description='В избранных')
-    def count(self, obj):
-        return obj.recipe.count()
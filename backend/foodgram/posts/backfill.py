@@ -0,0 +1,62 @@
+"""Перенос избранного и корзин из контейнеров в плоские таблицы.
+
+До миграции 0013 рядом с Favorite и ShoppingCart ещё лежат старые
+таблицы: контейнер на пользователя и его связь с рецептами. Пары
+(user, recipe) копируются сырым SQL пакетами по id строк связи, уже
+перенесённые пары пропускаются, так что копирование можно прервать и
+запустить снова. Этим пользуется команда backfill_memberships;
+миграция 0012 держит собственную копию того же SQL.
+"""
+from django.utils import timezone
+
+# (новая таблица, старая связь, старый контейнер, колонка контейнера)
+LEGACY_TABLES = (
+    ('posts_favorite', 'posts_favorite_recipe_recipe',
+     'posts_favorite_recipe', 'favorite_recipe_id'),
+    ('posts_shoppingcart', 'posts_shopping_recipe',
+     'posts_shopping', 'shopping_id'),
+)
+
+
+def get_legacy_tables(connection):
+    """Тройки LEGACY_TABLES, для которых есть и старые, и новые таблицы."""
+    existing = set(connection.introspection.table_names())
+    return [
+        tables for tables in LEGACY_TABLES
+        if all(table in existing for table in tables[:3])]
+
+
+def copy_memberships(connection, batch_size=10000, progress=None):
+    """Копирует пары из старых таблиц; возвращает {таблица: скопировано}.
+
+    progress(table, position, last_id, copied) вызывается после пакета.
+    """
+    created = connection.ops.adapt_datetimefield_value(timezone.now())
+    copied = {}
+    with connection.cursor() as cursor:
+        for table, through, container, column in get_legacy_tables(
+                connection):
+            copied[table] = 0
+            cursor.execute(f'SELECT MIN(id), MAX(id) FROM {through}')
+            first_id, last_id = cursor.fetchone()
+            if first_id is None:
+                continue
+            for start in range(first_id, last_id + 1, batch_size):
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, recipe_id, created) '
+                    f'SELECT c.user_id, t.recipe_id, %s '
+                    f'FROM {through} t '
+                    f'INNER JOIN {container} c ON c.id = t.{column} '
+                    f'WHERE t.id >= %s AND t.id < %s '
+                    f'AND c.user_id IS NOT NULL '
+                    f'AND NOT EXISTS (SELECT 1 FROM {table} f '
+                    f'WHERE f.user_id = c.user_id '
+                    f'AND f.recipe_id = t.recipe_id)',
+                    [created, start, start + batch_size])
+                copied[table] += max(cursor.rowcount, 0)
+                if progress is not None:
+                    progress(
+                        table, min(start + batch_size - 1, last_id),
+                        last_id, copied[table])
+    return copied
+
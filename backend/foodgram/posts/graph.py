@@ -0,0 +1,289 @@
+"""Выгрузка и загрузка графа рецептов в формате NDJSON.
+
+Каждая строка — объект с полем type: tag, ingredient, user, recipe или
+follow. Связи записаны естественными ключами (email пользователя, slug
+тэга, название и единица ингредиента), поэтому id в целевой базе
+назначаются заново. Избранное, корзины, тэги и ингредиенты рецепта
+вложены в сам рецепт. Обе стороны работают пакетами и держат в памяти
+только текущий пакет.
+"""
+import json
+from collections import defaultdict
+from itertools import groupby, islice
+
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from users.models import User
+
+from .importers import IngredientImporter
+from .models import (Favorite, Followers, Ingredient, Recipe,
+                     RecipiesIngredients, ShoppingCart, Tag)
+
+USER_FIELDS = (
+    'email', 'username', 'first_name', 'last_name', 'password',
+    'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login')
+TAG_FIELDS = ('name', 'color', 'slug')
+LOOKUP_SIZE = 500
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def dump(record):
+    return json.dumps(record, ensure_ascii=False, default=str) + '\n'
+
+
+def get_user_ids(emails):
+    """{email: id} для пользователей из пакета."""
+    ids = {}
+    for chunk in chunks(set(emails), LOOKUP_SIZE):
+        ids.update(User.objects.filter(
+            email__in=chunk).values_list('email', 'id'))
+    return ids
+
+
+def get_ingredient_ids(keys):
+    """{(name, measurement_unit): id} для ингредиентов из пакета."""
+    keys = set(keys)
+    ids = {}
+    for chunk in chunks({name for name, _ in keys}, LOOKUP_SIZE):
+        for name, unit, pk in Ingredient.objects.filter(
+                name__in=chunk).values_list(
+                    'name', 'measurement_unit', 'id'):
+            if (name, unit) in keys:
+                ids[name, unit] = pk
+    return ids
+
+
+class GraphExporter:
+    """Пишет граф рецептов в file построчно, пакетами по batch_size."""
+
+    def __init__(self, file, batch_size=1000):
+        self.file = file
+        self.batch_size = batch_size
+        self.counts = defaultdict(int)
+
+    def write(self, record_type, record):
+        self.file.write(dump({'type': record_type, **record}))
+        self.counts[record_type] += 1
+
+    def run(self):
+        for tag in Tag.objects.order_by('id').values(*TAG_FIELDS).iterator(
+                chunk_size=self.batch_size):
+            self.write('tag', tag)
+        for ingredient in Ingredient.objects.order_by('id').values(
+                'name', 'measurement_unit').iterator(
+                    chunk_size=self.batch_size):
+            self.write('ingredient', ingredient)
+        for user in User.objects.order_by('id').values(
+                *USER_FIELDS).iterator(chunk_size=self.batch_size):
+            self.write('user', user)
+        recipes = Recipe.objects.order_by('id').values(
+            'id', 'author__email', 'name', 'text', 'cooking_time', 'image',
+            'pub_date').iterator(chunk_size=self.batch_size)
+        for batch in chunks(recipes, self.batch_size):
+            self.write_recipes(batch)
+        for follow in Followers.objects.order_by('id').values_list(
+                'user__email', 'author__email', 'created').iterator(
+                    chunk_size=self.batch_size):
+            self.write('follow', dict(zip(
+                ('user', 'author', 'created'), follow)))
+        return self.counts
+
+    def write_recipes(self, batch):
+        ids = [recipe['id'] for recipe in batch]
+        related = defaultdict(lambda: defaultdict(list))
+        for recipe_id, name, unit, amount in (
+                RecipiesIngredients.objects.filter(
+                    recipe_id__in=ids).order_by('id').values_list(
+                        'recipe_id', 'ingredient__name',
+                        'ingredient__measurement_unit', 'amount')):
+            related[recipe_id]['ingredients'].append([name, unit, amount])
+        for recipe_id, slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=ids).values_list('recipe_id', 'tag__slug'):
+            related[recipe_id]['tags'].append(slug)
+        for key, model in (
+                ('favorited_by', Favorite),
+                ('in_carts', ShoppingCart)):
+            for recipe_id, email in model.objects.filter(
+                    recipe_id__in=ids).order_by('id').values_list(
+                        'recipe_id', 'user__email'):
+                related[recipe_id][key].append(email)
+        for recipe in batch:
+            recipe_id = recipe.pop('id')
+            recipe['author'] = recipe.pop('author__email')
+            for key in ('ingredients', 'tags', 'favorited_by', 'in_carts'):
+                recipe[key] = related[recipe_id][key]
+            self.write('recipe', recipe)
+
+
+class GraphImporter:
+    """Загружает граф рецептов из строк NDJSON пакетами.
+
+    Уже существующие тэги (по slug), ингредиенты, пользователи (по email),
+    рецепты (по автору, названию и дате) и подписки пропускаются, так что
+    повторная загрузка того же файла ничего не дублирует. Сигналы при
+    пакетной вставке не срабатывают, поэтому счётчики, списки покупок и
+    поисковые документы пересчитывает после загрузки import_graph.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.created = defaultdict(int)
+        self.skipped = defaultdict(int)
+        self.ingredients = IngredientImporter(batch_size=batch_size)
+
+    def run(self, lines):
+        records = (json.loads(line) for line in lines if line.strip())
+        for record_type, group in groupby(
+                records, key=lambda record: record.pop('type', None)):
+            handler = getattr(self, f'load_{record_type}s', None)
+            if handler is None:
+                raise ValueError(f'Неизвестный тип записи: {record_type}')
+            for batch in chunks(group, self.batch_size):
+                with transaction.atomic():
+                    handler(batch)
+        self.created['ingredient'] = self.ingredients.created
+        self.skipped['ingredient'] = (
+            self.ingredients.read - self.ingredients.created)
+        return self
+
+    def load_tags(self, batch):
+        existing = set(Tag.objects.filter(
+            slug__in=[tag['slug'] for tag in batch]
+        ).values_list('slug', flat=True))
+        new = [
+            Tag(**{field: tag[field] for field in TAG_FIELDS})
+            for tag in batch if tag['slug'] not in existing]
+        Tag.objects.bulk_create(new, ignore_conflicts=True)
+        self.created['tag'] += len(new)
+        self.skipped['tag'] += len(batch) - len(new)
+
+    def load_ingredients(self, batch):
+        self.ingredients.run(batch)
+
+    def load_users(self, batch):
+        existing = get_user_ids(user['email'] for user in batch)
+        new = []
+        for user in batch:
+            if user['email'] in existing:
+                continue
+            for field in ('date_joined', 'last_login'):
+                if user.get(field):
+                    user[field] = parse_datetime(user[field])
+            new.append(User(**{
+                field: user[field] for field in USER_FIELDS
+                if field in user}))
+        User.objects.bulk_create(new, ignore_conflicts=True)
+        created = len(get_user_ids(user.email for user in new))
+        self.created['user'] += created
+        self.skipped['user'] += len(batch) - created
+
+    def load_recipes(self, batch):
+        authors = get_user_ids(recipe['author'] for recipe in batch)
+        for recipe in batch:
+            recipe['author_id'] = authors.get(recipe['author'])
+            recipe['pub_date'] = parse_datetime(recipe['pub_date'])
+        batch, skipped = self.exclude_existing_recipes(batch)
+        self.skipped['recipe'] += skipped
+        if not batch:
+            return
+        recipes = [
+            Recipe(
+                author_id=recipe['author_id'], name=recipe['name'],
+                text=recipe['text'], cooking_time=recipe['cooking_time'],
+                image=recipe['image'] or None)
+            for recipe in batch]
+        if connection.features.can_return_ids_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+        for recipe, record in zip(recipes, batch):
+            recipe.pub_date = record['pub_date']
+        Recipe.objects.bulk_update(recipes, ('pub_date',))
+        self.created['recipe'] += len(recipes)
+        self.load_recipe_relations(recipes, batch)
+
+    def exclude_existing_recipes(self, batch):
+        """Убирает из пакета рецепты без автора и уже загруженные."""
+        with_author = [
+            recipe for recipe in batch if recipe['author_id'] is not None]
+        existing = set(Recipe.objects.filter(
+            author_id__in={recipe['author_id'] for recipe in with_author},
+            pub_date__in={recipe['pub_date'] for recipe in with_author},
+        ).values_list('author_id', 'name', 'pub_date'))
+        new = [
+            recipe for recipe in with_author
+            if (recipe['author_id'], recipe['name'], recipe['pub_date'])
+            not in existing]
+        return new, len(batch) - len(new)
+
+    def load_recipe_relations(self, recipes, batch):
+        ingredient_ids = get_ingredient_ids(
+            (name, unit)
+            for record in batch for name, unit, _ in record['ingredients'])
+        tag_ids = dict(Tag.objects.filter(slug__in={
+            slug for record in batch for slug in record['tags']
+        }).values_list('slug', 'id'))
+        RecipiesIngredients.objects.bulk_create(
+            (RecipiesIngredients(
+                recipe=recipe,
+                ingredient_id=ingredient_ids[name, unit],
+                amount=amount)
+             for recipe, record in zip(recipes, batch)
+             for name, unit, amount in record['ingredients']
+             if (name, unit) in ingredient_ids),
+            ignore_conflicts=True)
+        Recipe.tags.through.objects.bulk_create(
+            (Recipe.tags.through(recipe=recipe, tag_id=tag_ids[slug])
+             for recipe, record in zip(recipes, batch)
+             for slug in record['tags'] if slug in tag_ids),
+            ignore_conflicts=True)
+        users = get_user_ids(
+            email for record in batch
+            for key in ('favorited_by', 'in_carts') for email in record[key])
+        for key, model in (
+                ('favorited_by', Favorite),
+                ('in_carts', ShoppingCart)):
+            model.objects.bulk_create(
+                (model(user_id=users[email], recipe_id=recipe.pk)
+                 for recipe, record in zip(recipes, batch)
+                 for email in record[key] if email in users),
+                ignore_conflicts=True)
+
+    def load_follows(self, batch):
+        users = get_user_ids(
+            email for follow in batch
+            for email in (follow['user'], follow['author']))
+        pairs = {
+            (users[follow['user']], users[follow['author']]):
+            parse_datetime(follow['created'])
+            for follow in batch
+            if follow['user'] in users and follow['author'] in users}
+        existing = set(Followers.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id'))
+        new = {pair for pair in pairs if pair not in existing}
+        Followers.objects.bulk_create(
+            (Followers(user_id=user_id, author_id=author_id)
+             for user_id, author_id in new),
+            ignore_conflicts=True)
+        created = [
+            follow for follow in Followers.objects.filter(
+                user_id__in={user_id for user_id, _ in new},
+                author_id__in={author_id for _, author_id in new})
+            if (follow.user_id, follow.author_id) in new]
+        for follow in created:
+            follow.created = pairs[follow.user_id, follow.author_id]
+        Followers.objects.bulk_update(created, ('created',))
+        self.created['follow'] += len(new)
+        self.skipped['follow'] += len(batch) - len(new)
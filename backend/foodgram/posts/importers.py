@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.db import connection, transaction
+
+from .models import Ingredient
+
+JSON_READ_SIZE = 64 * 1024
+LOOKUP_SIZE = 500
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field(
+    'measurement_unit').max_length
+
+
+def read_csv(file):
+    """Строки CSV с заголовком name,measurement_unit."""
+    yield from csv.DictReader(file)
+
+
+def read_ndjson(file):
+    """Объекты JSON, по одному на строку."""
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_json(file):
+    """Элементы JSON-массива, разбираемые по мере чтения файла.
+
+    Весь файл в память не загружается: буфер дочитывается кусками
+    по JSON_READ_SIZE символов, пока очередной элемент не разберётся.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        chunk = file.read(JSON_READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started:
+                if position == len(buffer):
+                    break
+                if buffer[position] != '[':
+                    raise ValueError('Ожидался JSON-массив.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if not chunk:
+                    raise
+                break
+            if end == len(buffer) and chunk:
+                break
+            position = end
+            yield item
+        if not chunk:
+            if started:
+                raise ValueError('JSON-массив не закрыт.')
+            return
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'ndjson': read_ndjson,
+    'jsonl': read_ndjson,
+}
+
+
+def get_reader(path, file_format=None):
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.')
+    try:
+        return READERS[file_format.lower()]
+    except KeyError:
+        raise ValueError(f'Неизвестный формат файла: {file_format}')
+
+
+class IngredientImporter:
+    """Пакетная загрузка ингредиентов без дублей.
+
+    Строки читаются потоком и пишутся пакетами по batch_size. Дубли по
+    (name, measurement_unit) отбрасываются и внутри пакета, и при
+    вставке (unique_ingredient); существующие ингредиенты не меняются.
+    На PostgreSQL пакет идёт через COPY во временную таблицу и
+    INSERT ... ON CONFLICT DO NOTHING.
+    """
+
+    def __init__(self, batch_size=5000, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.read = self.created = self.skipped = 0
+        self.started = None
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0
+
+    def clean(self, row):
+        name = str(row.get('name') or '').strip()
+        unit = str(row.get('measurement_unit') or '').strip()
+        if (not name or not unit or len(name) > NAME_MAX_LENGTH
+                or len(unit) > UNIT_MAX_LENGTH):
+            return None
+        return name, unit
+
+    def run(self, rows):
+        if self.started is None:
+            self.started = time.monotonic()
+        rows = iter(rows)
+        use_copy = connection.vendor == 'postgresql'
+        if use_copy:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'CREATE TEMP TABLE IF NOT EXISTS ingredient_import '
+                    '(name varchar(200), measurement_unit varchar(200))')
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.read += len(batch)
+            keys = {}
+            for row in batch:
+                key = self.clean(row)
+                if key is None:
+                    self.skipped += 1
+                else:
+                    keys.setdefault(key, None)
+            with transaction.atomic():
+                if use_copy:
+                    self.created += self.copy_batch(keys)
+                else:
+                    self.created += self.insert_batch(keys)
+            if self.progress is not None:
+                self.progress(self)
+        return self
+
+    def insert_batch(self, keys):
+        names = list({name for name, _ in keys})
+        existing = set()
+        for start in range(0, len(names), LOOKUP_SIZE):
+            existing.update(Ingredient.objects.filter(
+                name__in=names[start:start + LOOKUP_SIZE]
+            ).values_list('name', 'measurement_unit'))
+        missing = [key for key in keys if key not in existing]
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in missing),
+            batch_size=LOOKUP_SIZE, ignore_conflicts=True)
+        return len(missing)
+
+    def copy_batch(self, keys):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(keys)
+        buffer.seek(0)
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE ingredient_import')
+            cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)', buffer)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT name, measurement_unit FROM ingredient_import '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING')
+            return cursor.rowcount
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.backfill import copy_memberships, get_legacy_tables
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенос избранного и корзин из старых контейнеров в плоские '
+        'таблицы пакетами. Запускать между migrate posts 0011 и полным '
+        'migrate: тогда миграция 0012 докопирует только остаток')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--skip-recount', action='store_true',
+            help='Не пересчитывать счётчики рецептов после переноса.')
+
+    def handle(self, *args, **options):
+        if not get_legacy_tables(connection):
+            self.stdout.write('Старых таблиц нет, переносить нечего.')
+            return
+        self.verbosity = options['verbosity']
+        self.started = time.monotonic()
+        copied = copy_memberships(
+            connection, options['batch_size'], self.progress)
+        for table, count in copied.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'{table}: перенесено {count}'))
+        if not options['skip_recount']:
+            call_command('recount', stdout=self.stdout)
+
+    def progress(self, table, position, last_id, copied):
+        if self.verbosity > 1 or position == last_id:
+            elapsed = time.monotonic() - self.started
+            self.stdout.write(
+                f'{table}: id {position}/{last_id}, '
+                f'скопировано {copied}, {elapsed:.1f} с')
@@ -0,0 +1,30 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.graph import GraphExporter
+
+
+class Command(BaseCommand):
+    help = ('Выгрузка тэгов, ингредиентов, пользователей, рецептов и '
+            'подписок в NDJSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки (.gz — со сжатием), по умолчанию stdout.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            GraphExporter(sys.stdout, options['batch_size']).run()
+            return
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as file:
+            counts = GraphExporter(file, options['batch_size']).run()
+        summary = ', '.join(
+            f'{record_type} {count}'
+            for record_type, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Выгружено: {summary}'))
@@ -1,23 +1,47 @@
-import csv
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from posts.models import Ingredient
+from api.cache import bump_version
+from posts.importers import IngredientImporter, get_reader
+from posts.search import ingredient_index
 
-TABLES_DICT = {
-    Ingredient: 'ingredients.csv'}
+DEFAULT_PATH = f'{settings.BASE_DIR}/static/data/ingredients.csv'
 
 
 class Command(BaseCommand):
-    help = 'Загрузка данных из csv файлов'
+    help = 'Загрузка ингредиентов из csv, json или ndjson файлов'
 
-    def handle(self, *args, **kwargs):
-        for model, base in TABLES_DICT.items():
-            with open(
-                f'{settings.BASE_DIR}/static/data/{base}',
-                'r', encoding='UTF-8'
-            ) as csv_file:
-                reader = csv.DictReader(csv_file)
-                model.objects.bulk_create(model(**data) for data in reader)
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=[DEFAULT_PATH],
+            help='Файлы для загрузки, по умолчанию static/data/'
+                 'ingredients.csv.')
+        parser.add_argument(
+            '--format', choices=('csv', 'json', 'ndjson'),
+            help='Формат файлов, если не совпадает с расширением.')
+        parser.add_argument('--batch-size', type=int, default=5000)
 
-        self.stdout.write(self.style.SUCCESS('Данные успешно загружены'))
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        importer = IngredientImporter(
+            batch_size=options['batch_size'], progress=self.report)
+        try:
+            for path in options['paths']:
+                reader = get_reader(path, options['format'])
+                with open(path, encoding='utf-8', newline='') as file:
+                    importer.run(reader(file))
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        finally:
+            ingredient_index.invalidate()
+            bump_version('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные успешно загружены: прочитано {importer.read}, '
+            f'добавлено {importer.created}, пропущено {importer.skipped} '
+            f'за {importer.elapsed:.1f} с ({importer.rate:.0f} строк/с)'))
+
+    def report(self, importer):
+        if self.verbosity > 0:
+            self.stdout.write(
+                f'{importer.read} строк, добавлено {importer.created}, '
+                f'{importer.rate:.0f} строк/с')
@@ -1,5 +1,6 @@
 from django.core.management import BaseCommand
 
+from api.cache import bump_version
 from posts.models import Tag
 
 
@@ -12,4 +13,5 @@ class Command(BaseCommand):
             {'name': 'Обед', 'color': '#49B64E', 'slug': 'dinner'},
             {'name': 'Ужин', 'color': '#8775D2', 'slug': 'supper'}]
         Tag.objects.bulk_create(Tag(**tag) for tag in data)
+        bump_version('tags')
         self.stdout.write(self.style.SUCCESS('Все данные залиты в бд'))
@@ -0,0 +1,50 @@
+import gzip
+import sys
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import bump_version
+from posts.graph import GraphImporter
+from posts.search import ingredient_index, recipe_index
+
+
+class Command(BaseCommand):
+    help = 'Загрузка выгрузки export_graph с новыми id'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл выгрузки (.gz — со сжатием) или - для stdin.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, списки покупок, поиск и '
+                 'популярность после загрузки.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        importer = GraphImporter(options['batch_size'])
+        try:
+            if path == '-':
+                importer.run(sys.stdin)
+            else:
+                opener = gzip.open if path.endswith('.gz') else open
+                with opener(path, 'rt', encoding='utf-8') as file:
+                    importer.run(file)
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(error)
+        finally:
+            ingredient_index.invalidate()
+            recipe_index.invalidate()
+            bump_version('tags')
+            bump_version('ingredients')
+        for record_type in {**importer.created, **importer.skipped}:
+            self.stdout.write(
+                f'{record_type}: добавлено {importer.created[record_type]}, '
+                f'пропущено {importer.skipped[record_type]}')
+        if not options['skip_rebuild']:
+            for command in (
+                    'recount', 'rebuild_shopping_lists',
+                    'rebuild_search_documents', 'update_popularity'):
+                call_command(command, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Recipe
+from posts.thumbnails import make_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Нарезка превью картинок рецептов, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать превью всех рецептов.')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image=None).order_by('id').values_list('id', 'image')
+        if not options['all']:
+            recipes = recipes.filter(thumbnails_ready=False)
+        last_id, done, failed = 0, 0, 0
+        while True:
+            batch = list(
+                recipes.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            for recipe_id, image_name in batch:
+                try:
+                    make_thumbnails(recipe_id, image_name)
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'Рецепт {recipe_id}: {error}')
+                else:
+                    done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Превью готовы: {done} рецептов, ошибок: {failed}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересборка поисковых документов рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        recipe_ids = Recipe.objects.order_by('id').values_list('id', flat=True)
+        last_id, total = 0, 0
+        while True:
+            batch = list(
+                recipe_ids.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1]
+            total += len(batch)
+            Recipe.objects.filter(pk__in=batch).update_search_documents()
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковые документы пересобраны: {total} рецептов'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import ShoppingListIngredient
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт или проверка списков покупок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сравнить с корзинами, ничего не меняя.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        user_ids = User.objects.order_by('id').values_list('id', flat=True)
+        batch_size = options['batch_size']
+        last_id, checked, broken = 0, 0, 0
+        while True:
+            batch = list(user_ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            checked += len(batch)
+            if options['verify']:
+                broken += self.verify(batch)
+            else:
+                ShoppingListIngredient.objects.rebuild(batch)
+        if not options['verify']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Списки покупок пересчитаны: {checked} пользователей'))
+        elif broken:
+            self.stdout.write(self.style.ERROR(
+                f'Расхождения у {broken} из {checked} пользователей'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Расхождений нет: {checked} пользователей'))
+
+    def verify(self, user_ids):
+        expected = {
+            (item['recipe__cart_items__user'], item['ingredient']):
+            item['total']
+            for item in ShoppingListIngredient.objects.expected(user_ids)}
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in
+            ShoppingListIngredient.objects.filter(
+                user_id__in=user_ids).values_list(
+                    'user_id', 'ingredient_id', 'amount')}
+        broken = {
+            key[0] for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)}
+        for user_id in sorted(broken):
+            self.stdout.write(f'Пользователь {user_id}: список расходится')
+        return len(broken)
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db.models import (Count, F, IntegerField, OuterRef, Q,
+                              Subquery)
+from django.db.models.functions import Coalesce
+
+from posts.models import Favorite, Followers, Recipe, ShoppingCart
+from users.models import User
+
+
+def count_of(queryset, field):
+    """Подзапрос с числом строк queryset на OuterRef('pk')."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('*')).values('total'),
+        output_field=IntegerField()), 0)
+
+
+COUNTERS = {
+    Recipe: {
+        'favorites_count': count_of(Favorite.objects.all(), 'recipe'),
+        'in_carts_count': count_of(ShoppingCart.objects.all(), 'recipe'),
+    },
+    User: {
+        'recipes_count': count_of(Recipe.objects.all(), 'author'),
+        'followers_count': count_of(Followers.objects.all(), 'author'),
+    },
+}
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков рецептов и пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только найти расхождения, ничего не меняя.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model, counters in COUNTERS.items():
+            checked, broken = 0, 0
+            ids = model.objects.order_by('pk').values_list('pk', flat=True)
+            last_id = 0
+            while True:
+                batch = list(
+                    ids.filter(pk__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1]
+                checked += len(batch)
+                broken += self.recount(
+                    model, counters, batch, options['verify'])
+            name = model._meta.verbose_name_plural
+            if not broken:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name}: расхождений нет ({checked})'))
+            elif options['verify']:
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: расхождения в {broken} из {checked}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name}: исправлено {broken} из {checked}'))
+
+    def recount(self, model, counters, batch, verify):
+        drift = Q()
+        for name in counters:
+            drift |= ~Q(**{name: F(f'actual_{name}')})
+        broken = list(model.objects.filter(pk__in=batch).annotate(
+            **{f'actual_{name}': expression
+               for name, expression in counters.items()}
+        ).filter(drift).values_list('pk', flat=True))
+        if broken and not verify:
+            model.objects.filter(pk__in=broken).update(**counters)
+        return len(broken)
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:12
+
+from django.db import migrations
+
+# Выражения совпадают с тем, что Django генерирует для
+# name__istartswith и name__icontains на PostgreSQL.
+CREATE_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS posts_ingredient_name_upper_like '
+    'ON posts_ingredient (UPPER(name::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS posts_ingredient_name_upper_trgm '
+    'ON posts_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS posts_ingredient_name_upper_like',
+    'DROP INDEX IF EXISTS posts_ingredient_name_upper_trgm',
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_shopping_list_ingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_INDEXES),
+            run_on_postgresql(DROP_INDEXES)),
+    ]
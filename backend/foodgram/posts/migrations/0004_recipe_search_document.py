@@ -0,0 +1,73 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:10
+
+from collections import defaultdict
+
+from django.conf import settings
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def fill_search_documents(apps, schema_editor):
+    Recipe = apps.get_model('posts', 'Recipe')
+    RecipiesIngredients = apps.get_model('posts', 'RecipiesIngredients')
+    last_id = 0
+    while True:
+        recipes = list(Recipe.objects.filter(id__gt=last_id).order_by(
+            'id').only('id', 'name', 'text')[:BATCH_SIZE])
+        if not recipes:
+            break
+        last_id = recipes[-1].id
+        names = defaultdict(list)
+        for recipe_id, name in RecipiesIngredients.objects.filter(
+                recipe__in=recipes).values_list(
+                    'recipe_id', 'ingredient__name'):
+            names[recipe_id].append(name)
+        for recipe in recipes:
+            recipe.search_document = '\n'.join((
+                recipe.name, ' '.join(names[recipe.id]), recipe.text))
+        Recipe.objects.bulk_update(recipes, ('search_document',))
+    if schema_editor.connection.vendor == 'postgresql':
+        Recipe.objects.update(search_vector=(
+            SearchVector(
+                'name', weight='A', config=settings.SEARCH_CONFIG)
+            + SearchVector(
+                'search_document', weight='B',
+                config=settings.SEARCH_CONFIG)))
+
+
+def run_on_postgresql(statement):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_ingredient_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Поисковый документ'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(
+            run_on_postgresql(
+                'CREATE INDEX IF NOT EXISTS posts_recipe_search_vector_gin '
+                'ON posts_recipe USING gin (search_vector)'),
+            run_on_postgresql(
+                'DROP INDEX IF EXISTS posts_recipe_search_vector_gin')),
+    ]
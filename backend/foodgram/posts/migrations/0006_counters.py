@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:16
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field):
+    return Coalesce(models.Subquery(
+        queryset.filter(**{field: models.OuterRef('pk')}).order_by().values(
+            field).annotate(total=models.Count('*')).values('total'),
+        output_field=models.IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('posts', 'Recipe')
+    Followers = apps.get_model('posts', 'Followers')
+    User = apps.get_model('users', 'User')
+    Recipe.objects.update(
+        favorites_count=count_of(
+            Recipe.favorite_recipe.through.objects.all(), 'recipe'),
+        in_carts_count=count_of(
+            Recipe.shopping_cart.through.objects.all(), 'recipe'))
+    User.objects.update(
+        recipes_count=count_of(Recipe.objects.all(), 'author'),
+        followers_count=count_of(Followers.objects.all(), 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+        ('posts', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
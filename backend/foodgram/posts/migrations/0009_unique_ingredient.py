@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает одинаковые ингредиенты в самый ранний перед UNIQUE."""
+    Ingredient = apps.get_model('posts', 'Ingredient')
+    RecipiesIngredients = apps.get_model('posts', 'RecipiesIngredients')
+    ShoppingListIngredient = apps.get_model(
+        'posts', 'ShoppingListIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    for group in list(duplicates):
+        keep = group['keep']
+        others = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit']
+        ).exclude(id=keep).values_list('id', flat=True))
+        for model, owner in (
+                (RecipiesIngredients, 'recipe_id'),
+                (ShoppingListIngredient, 'user_id')):
+            merged = {}
+            for row in model.objects.filter(
+                    ingredient_id__in=[keep, *others]).order_by(
+                        'ingredient_id', 'id'):
+                target = merged.get(getattr(row, owner))
+                if target is not None:
+                    target.amount += row.amount
+                    target.save(update_fields=['amount'])
+                    row.delete()
+                    continue
+                merged[getattr(row, owner)] = row
+                if row.ingredient_id != keep:
+                    row.ingredient_id = keep
+                    row.save(update_fields=['ingredient'])
+        Ingredient.objects.filter(id__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_recipe_thumbnails_ready'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
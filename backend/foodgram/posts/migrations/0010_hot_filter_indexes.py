@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+# Фильтр по тэгам идёт от тэга к рецептам, а у автоматической таблицы
+# связи есть только UNIQUE (recipe_id, tag_id) и индекс по tag_id.
+CREATE_RECIPE_TAGS_INDEX = (
+    'CREATE INDEX IF NOT EXISTS recipe_tags_tag_recipe_idx '
+    'ON posts_recipe_tags (tag_id, recipe_id)')
+DROP_RECIPE_TAGS_INDEX = 'DROP INDEX IF EXISTS recipe_tags_tag_recipe_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunSQL(CREATE_RECIPE_TAGS_INDEX, DROP_RECIPE_TAGS_INDEX),
+    ]
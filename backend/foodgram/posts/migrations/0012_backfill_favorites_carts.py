@@ -0,0 +1,83 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:34
+
+from django.db import migrations
+from django.utils import timezone
+
+BATCH_SIZE = 10000
+# (новая таблица, старая связь, старый контейнер, колонка контейнера).
+# SQL держится здесь, а не в posts.backfill, чтобы правки модуля не
+# меняли уже применённую миграцию.
+LEGACY_TABLES = (
+    ('posts_favorite', 'posts_favorite_recipe_recipe',
+     'posts_favorite_recipe', 'favorite_recipe_id'),
+    ('posts_shoppingcart', 'posts_shopping_recipe',
+     'posts_shopping', 'shopping_id'),
+)
+
+
+def copy_to_flat_tables(apps, schema_editor):
+    """Копирует пары (user, recipe) пакетами по id строк связи."""
+    connection = schema_editor.connection
+    created = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        for table, through, container, column in LEGACY_TABLES:
+            cursor.execute(f'SELECT MIN(id), MAX(id) FROM {through}')
+            first_id, last_id = cursor.fetchone()
+            if first_id is None:
+                continue
+            for start in range(first_id, last_id + 1, BATCH_SIZE):
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, recipe_id, created) '
+                    f'SELECT c.user_id, t.recipe_id, %s '
+                    f'FROM {through} t '
+                    f'INNER JOIN {container} c ON c.id = t.{column} '
+                    f'WHERE t.id >= %s AND t.id < %s '
+                    f'AND c.user_id IS NOT NULL '
+                    f'AND NOT EXISTS (SELECT 1 FROM {table} f '
+                    f'WHERE f.user_id = c.user_id '
+                    f'AND f.recipe_id = t.recipe_id)',
+                    [created, start, start + BATCH_SIZE])
+
+
+def copy_to_containers(apps, schema_editor):
+    """Обратный перенос: контейнер на пользователя и связи с рецептами."""
+    User = apps.get_model('users', 'User')
+    for flat_name, container_name, container_field in (
+            ('Favorite', 'Favorite_Recipe', 'favorite_recipe_id'),
+            ('ShoppingCart', 'Shopping', 'shopping_id')):
+        Flat = apps.get_model('posts', flat_name)
+        Container = apps.get_model('posts', container_name)
+        Through = Container.recipe.through
+        Container.objects.bulk_create(
+            Container(user_id=user_id)
+            for user_id in User.objects.exclude(
+                id__in=Container.objects.exclude(user=None).values('user_id')
+            ).values_list('id', flat=True).iterator())
+        containers = dict(Container.objects.exclude(
+            user=None).values_list('user_id', 'id'))
+        rows = Flat.objects.order_by('id').values_list(
+            'id', 'user_id', 'recipe_id')
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id)[:BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            Through.objects.bulk_create(
+                (Through(**{
+                    container_field: containers[user_id],
+                    'recipe_id': recipe_id})
+                 for _, user_id, recipe_id in batch),
+                ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+        ('posts', '0011_favorite_shoppingcart'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_to_flat_tables, copy_to_containers),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:34
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_backfill_favorites_carts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='shopping',
+            name='recipe',
+        ),
+        migrations.RemoveField(
+            model_name='shopping',
+            name='user',
+        ),
+        migrations.DeleteModel(
+            name='Favorite_Recipe',
+        ),
+        migrations.DeleteModel(
+            name='Shopping',
+        ),
+    ]
@@ -1,11 +1,28 @@
-from django.db import models
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, models, transaction
+from django.db.models.functions import RowNumber
 from django.core import validators
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.utils import timezone
 
 from users.models import User
 
 
+class IngredientQuerySet(models.QuerySet):
+
+    def search(self, value):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        return self.filter(name__icontains=value).annotate(
+            is_prefix=models.Case(
+                models.When(name__istartswith=value, then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField())
+        ).order_by('-is_prefix', 'name')
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         'Название ингредиента',
@@ -15,10 +32,16 @@ class Ingredient(models.Model):
         max_length=200
     )
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient')]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}.'
@@ -50,6 +73,93 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def previews(self, author_ids, limit=None):
+        """Последние рецепты авторов: {author_id: [recipe, ...]}.
+
+        С limit берётся не больше limit рецептов на автора одним запросом
+        с ROW_NUMBER() по автору.
+        """
+        previews = defaultdict(list)
+        author_ids = list(author_ids)
+        if not author_ids:
+            return previews
+        recipes = self.filter(author_id__in=author_ids).only(
+            'id', 'author_id', 'name', 'image', 'thumbnails_ready',
+            'cooking_time', 'pub_date')
+        if limit is not None:
+            sql, params = recipes.annotate(
+                row_number=models.Window(
+                    expression=RowNumber(),
+                    partition_by=[models.F('author_id')],
+                    order_by=[
+                        models.F('pub_date').desc(),
+                        models.F('id').desc()])
+            ).order_by().query.sql_with_params()
+            recipes = self.raw(
+                f'SELECT * FROM ({sql}) ranked '
+                f'WHERE ranked.row_number <= %s '
+                f'ORDER BY ranked.pub_date DESC, ranked.id DESC',
+                (*params, limit))
+        for recipe in recipes:
+            previews[recipe.author_id].append(recipe)
+        return previews
+
+    def update_search_documents(self):
+        """Пересобирает поисковые документы рецептов.
+
+        Документ — название, ингредиенты и описание одной строкой;
+        на PostgreSQL из него же строится взвешенный search_vector.
+        """
+        recipes = list(self.only('id', 'name', 'text'))
+        names = defaultdict(list)
+        for recipe_id, name in RecipiesIngredients.objects.filter(
+                recipe__in=recipes).values_list(
+                    'recipe_id', 'ingredient__name'):
+            names[recipe_id].append(name)
+        for recipe in recipes:
+            recipe.search_document = '\n'.join((
+                recipe.name, ' '.join(names[recipe.pk]), recipe.text))
+        self.model.objects.bulk_update(recipes, ('search_document',))
+        if connection.vendor == 'postgresql':
+            self.model.objects.filter(pk__in=recipes).update(
+                search_vector=(
+                    SearchVector(
+                        'name', weight='A',
+                        config=settings.SEARCH_CONFIG)
+                    + SearchVector(
+                        'search_document', weight='B',
+                        config=settings.SEARCH_CONFIG)))
+        from .search import recipe_index
+        recipe_index.invalidate()
+
+    def update_popularity(self, now=None):
+        """Пересчитывает популярность рецептов.
+
+        Каждое добавление в избранное или корзину даёт свой вес, который
+        затухает вдвое за каждые POPULARITY_HALF_LIFE часов с момента
+        добавления. Строки старше POPULARITY_WINDOW часов не учитываются:
+        их вклад уже пренебрежимо мал.
+        """
+        now = now or timezone.now()
+        since = now - timedelta(hours=settings.POPULARITY_WINDOW)
+        recipes = list(self.only('id'))
+        scores = defaultdict(float)
+        for model, weight in (
+                (Favorite, settings.POPULARITY_FAVORITE_WEIGHT),
+                (ShoppingCart, settings.POPULARITY_CART_WEIGHT)):
+            for recipe_id, created in model.objects.filter(
+                    recipe__in=recipes, created__gte=since
+            ).values_list('recipe_id', 'created').iterator():
+                hours = max((now - created).total_seconds(), 0) / 3600
+                scores[recipe_id] += weight * 0.5 ** (
+                    hours / settings.POPULARITY_HALF_LIFE)
+        for recipe in recipes:
+            recipe.popularity = scores[recipe.pk]
+        self.model.objects.bulk_update(recipes, ('popularity',))
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -91,11 +201,57 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    search_document = models.TextField(
+        'Поисковый документ',
+        blank=True,
+        default='',
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах',
+        default=0,
+        editable=False
+    )
+    popularity = models.FloatField(
+        'Популярность',
+        default=0,
+        editable=False
+    )
+    thumbnails_ready = models.BooleanField(
+        'Превью готовы',
+        default=False,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date', )
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'),
+            models.Index(
+                fields=['-popularity', '-pub_date', '-id'],
+                name='recipe_popularity_idx'),
+            models.Index(
+                fields=['cooking_time', '-pub_date', '-id'],
+                name='recipe_cooking_time_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx')]
 
     def __str__(self):
         return f'{self.author.email}, {self.name}'
@@ -148,6 +304,10 @@ class Followers(models.Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-id'],
+                name='followers_user_created_idx')]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
@@ -157,43 +317,188 @@ class Followers(models.Model):
         return f'Пользователь {self.user} -> автор {self.author}'
 
 
-class Favorite_Recipe(models.Model):
-    user = models.OneToOneField(
+class Favorite(models.Model):
+    user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        null=True,
-        related_name='favorite_recipe',
+        related_name='favorites',
         verbose_name='Пользователь'
     )
-    recipe = models.ManyToManyField(
+    recipe = models.ForeignKey(
         Recipe,
-        related_name='favorite_recipe',
-        verbose_name='Избранный рецепт'
+        on_delete=models.CASCADE,
+        related_name='favorites',
+        verbose_name='Рецепт'
+    )
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True
     )
 
-    @receiver(post_save, sender=User)
-    def create_favorite_recipe(
-            sender, instance, created, **kwargs):
-        if created:
-            return Favorite_Recipe.objects.create(user=instance)
+    class Meta:
+        verbose_name = 'Избранный рецепт'
+        verbose_name_plural = 'Избранные рецепты'
+        ordering = ['-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_favorite')]
+
+    def __str__(self):
+        return f'{self.user} -> {self.recipe_id}'
 
 
-class Shopping(models.Model):
-    user = models.OneToOneField(
+class ShoppingCart(models.Model):
+    user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='shopping_cart',
-        null=True,
+        related_name='cart_items',
         verbose_name='Пользователь'
     )
-    recipe = models.ManyToManyField(
+    recipe = models.ForeignKey(
         Recipe,
-        related_name='shopping_cart',
-        verbose_name='Покупка'
+        on_delete=models.CASCADE,
+        related_name='cart_items',
+        verbose_name='Рецепт'
+    )
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Рецепт в корзине'
+        verbose_name_plural = 'Корзины'
+        ordering = ['-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_cart_item')]
+
+    def __str__(self):
+        return f'{self.user} -> {self.recipe_id}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+
+    def expected(self, user_ids=None):
+        """Суммы ингредиентов по корзинам, посчитанные заново."""
+        if user_ids is None:
+            queryset = RecipiesIngredients.objects.filter(
+                recipe__cart_items__isnull=False)
+        else:
+            queryset = RecipiesIngredients.objects.filter(
+                recipe__cart_items__user__in=user_ids)
+        return queryset.values(
+            'recipe__cart_items__user', 'ingredient'
+        ).annotate(total=models.Sum('amount')).order_by()
+
+    def apply(self, changes):
+        """Применяет изменения {user_id: {ingredient_id: delta}}."""
+        changes = {
+            user_id: deltas for user_id, deltas in changes.items()
+            if any(deltas.values())}
+        if not changes:
+            return
+        ingredient_ids = {
+            ingredient_id
+            for deltas in changes.values() for ingredient_id in deltas}
+        with transaction.atomic():
+            existing = self.select_for_update().filter(
+                user_id__in=changes, ingredient_id__in=ingredient_ids)
+            to_update, to_delete = [], []
+            for item in existing:
+                delta = changes[item.user_id].pop(item.ingredient_id, 0)
+                if not delta:
+                    continue
+                item.amount += delta
+                if item.amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.pk)
+            self.bulk_update(to_update, ('amount',))
+            self.filter(pk__in=to_delete).delete()
+            self.bulk_create(
+                self.model(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=delta)
+                for user_id, deltas in changes.items()
+                for ingredient_id, delta in deltas.items() if delta > 0)
+
+    def add_recipes(self, pairs, sign=1):
+        """Добавляет (или вычитает) рецепты из пар (user_id, recipe_id)."""
+        pairs = list(pairs)
+        if not pairs:
+            return
+        amounts = defaultdict(list)
+        for recipe_id, ingredient_id, amount in (
+                RecipiesIngredients.objects.filter(
+                    recipe_id__in={recipe_id for _, recipe_id in pairs}
+                ).values_list('recipe_id', 'ingredient_id', 'amount')):
+            amounts[recipe_id].append((ingredient_id, amount))
+        changes = defaultdict(lambda: defaultdict(int))
+        for user_id, recipe_id in pairs:
+            for ingredient_id, amount in amounts[recipe_id]:
+                changes[user_id][ingredient_id] += sign * amount
+        self.apply(changes)
+
+    def change_recipe(self, recipe, old_amounts, new_amounts=None):
+        """Переносит в корзины изменение состава рецепта."""
+        if new_amounts is None:
+            new_amounts = dict(
+                recipe.recipe.values_list('ingredient_id', 'amount'))
+        deltas = {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in {*old_amounts, *new_amounts}}
+        if not any(deltas.values()):
+            return
+        self.apply({
+            user_id: dict(deltas)
+            for user_id in recipe.cart_items.values_list(
+                'user_id', flat=True)})
+
+    def rebuild(self, user_ids):
+        """Пересчитывает списки покупок пользователей с нуля."""
+        with transaction.atomic():
+            self.filter(user_id__in=user_ids).delete()
+            self.bulk_create(
+                self.model(
+                    user_id=item['recipe__cart_items__user'],
+                    ingredient_id=item['ingredient'],
+                    amount=item['total'])
+                for item in self.expected(user_ids))
+
+
+class ShoppingListIngredient(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_lists',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(
+        'Количество'
     )
 
-    @receiver(post_save, sender=User)
-    def create_shopping_cart(
-            sender, instance, created, **kwargs):
-        if created:
-            return Shopping.objects.create(user=instance)
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_ingredient')]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.amount}'
@@ -3,6 +3,7 @@ from django.contrib import admin
 from .models import RecipiesIngredients
 
 
-class RecipeIngredientAdmin(admin.StackedInline):
+class RecipeIngredientAdmin(admin.TabularInline):
     model = RecipiesIngredients
     autocomplete_fields = ('ingredient',)
+    extra = 0
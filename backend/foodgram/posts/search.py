@@ -0,0 +1,171 @@
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+
+from .models import Ingredient, Recipe
+
+TOKEN_RE = re.compile(r'\w+')
+NAME_WEIGHT = 3
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class CachedData:
+    """Данные из базы, закэшированные в памяти процесса.
+
+    Подкласс собирает их в _build(), а ttl_setting называет настройку со
+    сроком жизни в секундах: после него данные пересобираются, чтобы
+    подхватить записи из других процессов. Сборка идёт без блокировки,
+    пока она длится, читатели получают прежние данные. invalidate()
+    сбрасывает кэш; сборка, начатая до сброса, не сохраняется.
+    """
+
+    ttl_setting = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._built_at = 0
+        self._generation = 0
+        self._building = False
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+            self._generation += 1
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _get(self):
+        with self._lock:
+            data = self._data
+            expired = (
+                time.monotonic() - self._built_at
+                > getattr(settings, self.ttl_setting))
+            if data is not None and (not expired or self._building):
+                return data
+            self._building = True
+            generation = self._generation
+        try:
+            data = self._build()
+        finally:
+            with self._lock:
+                self._building = False
+        with self._lock:
+            if generation == self._generation:
+                self._data = data
+                self._built_at = time.monotonic()
+        return data
+
+
+class IngredientIndex(CachedData):
+    """Отсортированный по названию массив ингредиентов.
+
+    Сбрасывается сигналами записи ингредиентов. Каталог больше
+    INGREDIENT_INDEX_MAX_SIZE в память не грузится, search тогда
+    возвращает None, и искать нужно в базе.
+    """
+
+    ttl_setting = 'INGREDIENT_INDEX_TTL'
+
+    def _build(self):
+        max_size = settings.INGREDIENT_INDEX_MAX_SIZE
+        rows = list(islice(
+            Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator(),
+            max_size + 1))
+        if len(rows) > max_size:
+            return None, None
+        rows = sorted(
+            (name.lower(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in rows)
+        keys = [row[0] for row in rows]
+        entries = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows]
+        return keys, entries
+
+    def search(self, query, limit):
+        """Сначала совпадения по началу названия, затем по подстроке.
+
+        Возвращает None, если каталог слишком велик для индекса.
+        """
+        keys, entries = self._get()
+        if keys is None:
+            return None
+        query = query.lower()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        results = entries[start:min(end, start + limit)]
+        for position, key in enumerate(keys):
+            if len(results) >= limit:
+                break
+            if query in key and not start <= position < end:
+                results.append(entries[position])
+        return results
+
+
+class RecipeIndex(CachedData):
+    """Инвертированный индекс поисковых документов рецептов.
+
+    Используется вместо search_vector на базах, отличных от PostgreSQL.
+    Слова запроса ищутся по началу слов документа, найтись должны все;
+    совпадения в названии весят больше. Сбрасывается при пересборке
+    поисковых документов.
+    """
+
+    ttl_setting = 'RECIPE_INDEX_TTL'
+
+    def _build(self):
+        postings = defaultdict(dict)
+        size = 0
+        for pk, name, document in Recipe.objects.values_list(
+                'id', 'name', 'search_document').iterator():
+            size += 1
+            weights = Counter(tokenize(document))
+            for term in tokenize(name):
+                weights[term] += NAME_WEIGHT
+            for term, weight in weights.items():
+                postings[term][pk] = weight
+        return sorted(postings), dict(postings), size
+
+    def search(self, query, limit):
+        """Возвращает [(recipe_id, score)] по убыванию релевантности."""
+        terms, postings, size = self._get()
+        scores = None
+        for word in set(tokenize(query)):
+            word_scores = defaultdict(float)
+            position = bisect_left(terms, word)
+            while position < len(terms) and terms[position].startswith(word):
+                matches = postings[terms[position]]
+                idf = math.log(1 + size / len(matches))
+                for pk, weight in matches.items():
+                    word_scores[pk] += weight * idf
+                position += 1
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {
+                    pk: score + word_scores[pk]
+                    for pk, score in scores.items() if pk in word_scores}
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        return sorted(
+            scores.items(), key=lambda item: (-item[1], -item[0]))[:limit]
+
+
+ingredient_index = IngredientIndex()
+recipe_index = RecipeIndex()
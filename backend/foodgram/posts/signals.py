@@ -0,0 +1,97 @@
+from collections import Counter, defaultdict
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import User
+
+from .models import (Favorite, Followers, Ingredient, Recipe, ShoppingCart,
+                     ShoppingListIngredient, Tag)
+from .search import ingredient_index, recipe_index
+from .tags import tag_ids
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListIngredient.objects.add_recipes(
+            [(instance.user_id, instance.recipe_id)])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его ингредиенты
+    # ещё на месте.
+    ShoppingListIngredient.objects.add_recipes(
+        [(instance.user_id, instance.recipe_id)], sign=-1)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_index(sender, **kwargs):
+    recipe_index.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_ids(sender, **kwargs):
+    tag_ids.invalidate()
+
+
+def change_counter(model, field, ids, sign=1):
+    """Сдвигает счётчик field на sign за каждое вхождение id в ids."""
+    groups = defaultdict(list)
+    for pk, count in Counter(ids).items():
+        groups[count].append(pk)
+    for count, pks in groups.items():
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + sign * count, 0)})
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def add_to_recipe_counters(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe, RECIPE_COUNTERS[sender], [instance.recipe_id])
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_recipe_counters(sender, instance, **kwargs):
+    change_counter(
+        Recipe, RECIPE_COUNTERS[sender], [instance.recipe_id], sign=-1)
+
+
+@receiver(post_save, sender=Recipe)
+def add_to_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, 'recipes_count', [instance.author_id])
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_recipes_count(sender, instance, **kwargs):
+    change_counter(User, 'recipes_count', [instance.author_id], sign=-1)
+
+
+@receiver(post_save, sender=Followers)
+def add_to_followers_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, 'followers_count', [instance.author_id])
+
+
+@receiver(post_delete, sender=Followers)
+def remove_from_followers_count(sender, instance, **kwargs):
+    change_counter(User, 'followers_count', [instance.author_id], sign=-1)
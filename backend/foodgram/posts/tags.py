@@ -0,0 +1,23 @@
+from .models import Tag
+from .search import CachedData
+
+
+class TagIds(CachedData):
+    """Соответствие slug → id тэгов.
+
+    Тэгов немного, поэтому загружаются все сразу при первом обращении.
+    Сбрасывается сигналами записи тэгов.
+    """
+
+    ttl_setting = 'TAG_IDS_TTL'
+
+    def _build(self):
+        return dict(Tag.objects.values_list('slug', 'id'))
+
+    def get(self, slugs):
+        """{slug: id} для известных slug из slugs."""
+        ids = self._get()
+        return {slug: ids[slug] for slug in slugs if slug in ids}
+
+
+tag_ids = TagIds()
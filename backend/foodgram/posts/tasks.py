@@ -0,0 +1,5 @@
+from jobs.queue import task
+
+from .thumbnails import make_thumbnails
+
+task('posts.make_thumbnails')(make_thumbnails)
@@ -0,0 +1,243 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from jobs.models import Job
+from users.models import User
+
+from .importers import IngredientImporter, get_reader, read_json
+from .models import (Favorite, Ingredient, Recipe, RecipiesIngredients,
+                     ShoppingCart, ShoppingListIngredient, Tag)
+from .search import CachedData
+
+
+class CountingData(CachedData):
+    ttl_setting = 'TAG_IDS_TTL'
+    builds = 0
+
+    def _build(self):
+        self.builds += 1
+        return self.builds
+
+
+class CachedDataTests(SimpleTestCase):
+
+    def test_invalidate(self):
+        counter = CountingData()
+        self.assertEqual([counter._get(), counter._get()], [1, 1])
+        counter.invalidate()
+        self.assertEqual(counter._get(), 2)
+
+    @override_settings(TAG_IDS_TTL=-1)
+    def test_expired(self):
+        counter = CountingData()
+        self.assertEqual([counter._get(), counter._get()], [1, 2])
+
+
+class RecipePreviewsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        for number in range(3):
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}',
+                text='Описание', cooking_time=10)
+
+    def test_no_authors(self):
+        for limit in (None, 3):
+            with self.assertNumQueries(0):
+                self.assertEqual(Recipe.objects.previews([], limit), {})
+
+    def test_limit(self):
+        previews = Recipe.objects.previews([self.author.pk], 2)
+        self.assertEqual(
+            [recipe.name for recipe in previews[self.author.pk]],
+            ['Рецепт 2', 'Рецепт 1'])
+
+
+
+class RecipePopularityTests(TestCase):
+
+    def test_recent_activity(self):
+        now = timezone.now()
+        users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com',
+                username=f'user{number}', first_name='Имя',
+                last_name='Фамилия', password='pass')
+            for number in range(2)]
+        old, fresh = (
+            Recipe.objects.create(
+                author=users[0], name=name, text='Описание',
+                cooking_time=10)
+            for name in ('Старый', 'Новый'))
+        Recipe.objects.filter(pk=old.pk).update(
+            pub_date=now - timedelta(days=365))
+        half_life = timedelta(hours=settings.POPULARITY_HALF_LIFE)
+        Favorite.objects.create(user=users[0], recipe=old)
+        ShoppingCart.objects.create(user=users[1], recipe=old)
+        for model, user in ((Favorite, users[0]), (ShoppingCart, users[1])):
+            model.objects.create(user=user, recipe=fresh)
+        Favorite.objects.filter(recipe=fresh).update(
+            created=now - half_life)
+        ShoppingCart.objects.filter(recipe=fresh).update(
+            created=now - timedelta(
+                hours=settings.POPULARITY_WINDOW + 1))
+        Recipe.objects.update_popularity(now)
+        old.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertAlmostEqual(
+            old.popularity,
+            settings.POPULARITY_FAVORITE_WEIGHT
+            + settings.POPULARITY_CART_WEIGHT, places=3)
+        self.assertAlmostEqual(
+            fresh.popularity, settings.POPULARITY_FAVORITE_WEIGHT / 2,
+            places=3)
+
+class RecipeAdminShoppingListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        cls.salt, cls.sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар'))
+        cls.recipe = Recipe.objects.create(
+            author=cls.admin, name='Рецепт', text='Описание',
+            cooking_time=10)
+        cls.row = RecipiesIngredients.objects.create(
+            recipe=cls.recipe, ingredient=cls.salt, amount=5)
+        ShoppingCart.objects.create(user=cls.admin, recipe=cls.recipe)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def save(self, **data):
+        return self.client.post(
+            f'/admin/posts/recipe/{self.recipe.pk}/change/', {
+                'author': self.admin.pk, 'name': 'Рецепт',
+                'text': 'Описание', 'cooking_time': 10,
+                'tags': [self.tag.pk],
+                'recipe-TOTAL_FORMS': 1, 'recipe-INITIAL_FORMS': 1,
+                'recipe-MIN_NUM_FORMS': 0, 'recipe-MAX_NUM_FORMS': 1000,
+                'recipe-0-id': self.row.pk,
+                'recipe-0-recipe': self.recipe.pk,
+                'recipe-0-ingredient': self.salt.pk,
+                'recipe-0-amount': 5,
+                **data})
+
+    def test_inline_changes(self):
+        response = self.save(**{
+            'recipe-TOTAL_FORMS': 2, 'recipe-0-DELETE': 'on',
+            'recipe-1-recipe': self.recipe.pk,
+            'recipe-1-ingredient': self.sugar.pk,
+            'recipe-1-amount': 3})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(ShoppingListIngredient.objects.values_list(
+                'ingredient_id', 'amount')),
+            [(self.sugar.pk, 3)])
+
+    @override_settings(JOBS_EAGER=False)
+    def test_image_change(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image='static/recipe/old.png', thumbnails_ready=True)
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, 'PNG')
+        image = SimpleUploadedFile(
+            'new.png', buffer.getvalue(), content_type='image/png')
+        with tempfile.TemporaryDirectory() as media, \
+                override_settings(MEDIA_ROOT=media):
+            response = self.save(image=image)
+        self.assertEqual(response.status_code, 302)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.thumbnails_ready)
+        job = Job.objects.get(task='posts.make_thumbnails')
+        self.assertEqual(json.loads(job.payload), {
+            'recipe_id': self.recipe.pk,
+            'image_name': self.recipe.image.name})
+
+    @override_settings(JOBS_EAGER=False)
+    def test_unchanged_image(self):
+        self.assertEqual(self.save().status_code, 302)
+        self.assertFalse(Job.objects.exists())
+
+
+class IngredientImportTests(TestCase):
+    """Загрузка через SQLite-ветку: bulk_create без COPY."""
+
+    ROWS = [
+        {'name': 'Соль', 'measurement_unit': 'г'},
+        {'name': 'Соль', 'measurement_unit': 'г'},
+        {'name': 'Соль', 'measurement_unit': 'щепотка'},
+        {'name': 'Сахар', 'measurement_unit': 'г'},
+        {'name': '', 'measurement_unit': 'г'},
+    ]
+
+    def write(self, directory, file_format):
+        path = os.path.join(directory, f'ingredients.{file_format}')
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            if file_format == 'csv':
+                writer = csv.DictWriter(
+                    file, fieldnames=('name', 'measurement_unit'))
+                writer.writeheader()
+                writer.writerows(self.ROWS)
+            else:
+                json.dump(self.ROWS, file, ensure_ascii=False)
+        return path
+
+    def run_import(self, path, batch_size=2):
+        with open(path, encoding='utf-8', newline='') as file:
+            return IngredientImporter(batch_size=batch_size).run(
+                get_reader(path)(file))
+
+    def assert_imported_twice(self, file_format):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write(directory, file_format)
+            first = self.run_import(path)
+            second = self.run_import(path)
+        self.assertEqual(
+            (first.read, first.created, first.skipped), (5, 3, 1))
+        self.assertEqual(
+            (second.read, second.created, second.skipped), (5, 0, 1))
+        self.assertCountEqual(
+            Ingredient.objects.values_list('name', 'measurement_unit'),
+            [('Соль', 'г'), ('Соль', 'щепотка'), ('Сахар', 'г')])
+
+    def test_csv(self):
+        self.assert_imported_twice('csv')
+
+    def test_json(self):
+        # Маленький буфер заставляет дочитывать элементы по кускам.
+        with mock.patch('posts.importers.JSON_READ_SIZE', 7):
+            self.assert_imported_twice('json')
+
+    def test_unclosed_json(self):
+        with self.assertRaises(ValueError):
+            list(read_json(io.StringIO('[{"name": "Соль"}')))
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write(directory, 'csv')
+            output = io.StringIO()
+            call_command('fill_ingdts', path, stdout=output)
+        self.assertIn('добавлено 3', output.getvalue())
+        self.assertEqual(Ingredient.objects.count(), 3)
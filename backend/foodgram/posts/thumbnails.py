@@ -0,0 +1,72 @@
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from jobs.queue import enqueue
+
+from .models import Recipe
+
+THUMBNAIL_SIZES = {
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def get_thumbnail_name(image_name, size, image_format):
+    path = PurePosixPath(image_name)
+    extension = THUMBNAIL_FORMATS[image_format][1]
+    return str(path.parent / 'thumbnails' / f'{path.stem}_{size}.{extension}')
+
+
+def get_thumbnail_urls(recipe):
+    """Ссылки на превью {размер: {формат: url}} или None, пока их нет."""
+    if not recipe.image or not recipe.thumbnails_ready:
+        return None
+    storage = recipe.image.storage
+    return {
+        size: {
+            image_format: storage.url(
+                get_thumbnail_name(recipe.image.name, size, image_format))
+            for image_format in THUMBNAIL_FORMATS}
+        for size in THUMBNAIL_SIZES}
+
+
+def make_thumbnails(recipe_id, image_name):
+    """Нарезает превью картинки рецепта и отмечает их готовность."""
+    storage = Recipe._meta.get_field('image').storage
+    with storage.open(image_name) as source:
+        image = Image.open(source)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert(
+            'RGBA' if 'transparency' in image.info
+            or image.mode in ('LA', 'PA') else 'RGB')
+    for size, box in THUMBNAIL_SIZES.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail(box)
+        for image_format, (pil_format, _) in THUMBNAIL_FORMATS.items():
+            if pil_format == 'JPEG' and thumbnail.mode != 'RGB':
+                thumbnail = thumbnail.convert('RGB')
+            buffer = BytesIO()
+            thumbnail.save(
+                buffer, pil_format, quality=settings.THUMBNAIL_QUALITY)
+            name = get_thumbnail_name(image_name, size, image_format)
+            storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+    Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        thumbnails_ready=True)
+
+
+def schedule_thumbnails(recipe):
+    """Ставит нарезку превью рецепта в очередь фоновых задач."""
+    if recipe.image:
+        enqueue(
+            'posts.make_thumbnails',
+            recipe_id=recipe.pk, image_name=recipe.image.name)